@@ -0,0 +1,111 @@
+"""
+Measures the hot path of :class:`laggard.buffer.Buffer`: fetching characters past skipped whitespace,
+peeking, and looking ahead.
+
+The "before" figures come from the original implementations, reproduced in :class:`LegacyBuffer`
+(including the print in `mark`, sent to /dev/null), and the "after" figures from :class:`~laggard.buffer.Buffer`.
+
+Run from the repository root with::
+
+    python -m benchmarks.bench_buffer
+"""
+import contextlib
+import os
+import timeit
+
+from laggard.buffer import Buffer
+
+SKIP = [" ", "\n", "\t"]
+
+
+class LegacyBuffer(Buffer):
+    """The Buffer hot path before the skip table: a list of skipped characters, and a marked peek."""
+
+    def __init__(self, source, skip=[]):
+        super().__init__(source, skip)
+        self.skip_list = list(skip)
+
+    def fetch_char(self, skip=True):
+        try:
+            while True:
+                x = self.source[self.current_index]
+                self.current_index += 1
+                if x not in self.skip_list or (not skip):
+                    return x
+        except IndexError:
+            return "[EOF]"
+
+    def fetch(self, count=1, skip=True):
+        retval = ""
+        if skip == "initial":
+            retval += self.fetch_char(True)
+            count -= 1
+            skip = False
+        for i in range(count):
+            retval += self.fetch_char(skip)
+        return retval
+
+    def peek(self, count=1, skip=True):
+        self.mark()
+        try:
+            return self.fetch(count, skip)
+        finally:
+            self.abandon()
+
+    def mark(self):
+        self.stack.append(self.current_index)
+        print(len(self.stack))
+
+
+def spaced_tokens(indent):
+    """Single-character tokens, each after a newline and `indent` spaces."""
+    return ("\n" + " " * indent + "x") * 5000
+
+
+def fetch_all(buffer_class, source, passes):
+    """Fetches every character `passes` times, as a parser which backtracks over the input would."""
+    def run():
+        buffer = buffer_class(source, skip=SKIP)
+        for _ in range(passes):
+            buffer.current_index = 0
+            while buffer.fetch_char() != "[EOF]":
+                pass
+
+    return run
+
+
+def peek_all(buffer_class, source, passes):
+    """Peeks at two characters before fetching each one."""
+    def run():
+        buffer = buffer_class(source, skip=SKIP)
+        for _ in range(passes):
+            buffer.current_index = 0
+            while buffer.peek(2) != "[EOF][EOF]":
+                buffer.fetch_char()
+
+    return run
+
+
+def measure(name, factory, buffer_class, source, passes, repeat=3):
+    run = factory(buffer_class, source, passes)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        best = min(timeit.repeat(run, number=1, repeat=repeat))
+    print("{:<32} {:>12.0f} chars/s".format(name, passes * len(source) / best))
+
+
+def main():
+    # A single pass includes building the skip table; more passes spread its cost
+    for passes in (1, 4):
+        for indent in (0, 8, 64):
+            source = spaced_tokens(indent)
+            name = "fetch_char({}) x{}".format(indent, passes)
+            measure(name + " before", fetch_all, LegacyBuffer, source, passes)
+            measure(name + " after", fetch_all, Buffer, source, passes)
+    for indent in (0, 8):
+        source = spaced_tokens(indent)
+        measure("peek({}) before".format(indent), peek_all, LegacyBuffer, source, 1)
+        measure("peek({}) after".format(indent), peek_all, Buffer, source, 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Measures the throughput of the lexical helpers, on identifiers and string literals.
+
+The "before" figures come from the original character-at-a-time implementations, reproduced below,
+and the "after" figures from :mod:`laggard.helpers`.
+
+Run from the repository root with::
+
+    python -m benchmarks.bench_helpers
+"""
+import string
+import timeit
+
+from laggard import helpers
+from laggard.buffer import Buffer
+from laggard.exceptions import ParseException
+
+IDENTIFIER_CHARS = list(string.ascii_letters + string.digits)
+
+
+def legacy_expectOneOf(buffer: Buffer, charset, skip=True):
+    with buffer:
+        x = buffer.fetch_char(skip)
+        if x in charset:
+            return x
+        else:
+            buffer.cry("expected one of {}, got {}".format(', '.join(charset), x))
+
+
+def legacy_expectManyOutOf(buffer: Buffer, charset):
+    with buffer:
+        v = legacy_expectOneOf(buffer, charset, skip=True)
+        try:
+            while True:
+                v += legacy_expectOneOf(buffer, charset, skip=False)
+        except ParseException:
+            return v
+
+
+def legacy_parseUntil(buffer: Buffer, charset):
+    with buffer:
+        return_val = ""
+        last_char = None
+        while last_char not in charset:
+            last_char = buffer.fetch_char(False)
+            return_val += last_char
+        return return_val[:-1]
+
+
+def identifiers(expect_many, count, length):
+    source = " ".join(["ident" + "x" * (length - 5)] * count)
+
+    def run():
+        buffer = Buffer(source, skip=[" "])
+        for _ in range(count):
+            expect_many(buffer, IDENTIFIER_CHARS)
+
+    return source, run
+
+
+def string_literals(parse_until, count, length):
+    source = ('"' + "s" * length + '"') * count
+
+    def run():
+        buffer = Buffer(source)
+        for _ in range(count):
+            buffer.fetch_char()
+            parse_until(buffer, ['"'])
+
+    return source, run
+
+
+def measure(name, factory, implementation, count, length, repeat=3):
+    source, run = factory(implementation, count, length)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    print("{:<32} {:>12.0f} chars/s".format(name, len(source) / best))
+
+
+def main():
+    for length in (8, 64):
+        measure("identifiers({}) before".format(length), identifiers, legacy_expectManyOutOf, 2000, length)
+        measure("identifiers({}) after".format(length), identifiers, helpers.expectManyOutOf, 2000, length)
+    for length in (16, 1024):
+        measure("string literals({}) before".format(length), string_literals, legacy_parseUntil, 200, length)
+        measure("string literals({}) after".format(length), string_literals, helpers.parseUntil, 200, length)
+
+
+if __name__ == "__main__":
+    main()
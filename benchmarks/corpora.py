@@ -0,0 +1,135 @@
+"""
+Generates inputs for the benchmark grammars, of roughly a given size.
+Each generator is deterministic for a given size, so results from different commits are comparable.
+"""
+import random
+import string
+
+from benchmarks.grammars import KEYWORD_LIST
+
+LETTERS = string.ascii_lowercase
+
+
+def _number(rng: random.Random) -> str:
+    return str(rng.randint(0, 10 ** rng.randint(1, 6)))
+
+
+def _factor(rng: random.Random, depth: int) -> str:
+    roll = rng.random()
+    if depth < 3 and roll < 0.15:
+        return "(" + _expression(rng, depth + 1, rng.randint(1, 4)) + ")"
+    elif roll < 0.2:
+        return "-" + _number(rng)
+    return _number(rng)
+
+
+def _expression(rng: random.Random, depth: int, terms: int) -> str:
+    parts = []
+    for i in range(terms):
+        if i:
+            parts.append(rng.choice("+-"))
+        parts.append(_factor(rng, depth))
+        for _ in range(rng.randint(0, 2)):
+            parts.append(rng.choice("*/") + _factor(rng, depth))
+    return "".join(parts)
+
+
+def arithmetic(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = [_expression(rng, 0, 1)]
+    length = len(parts[0])
+    while length < size:
+        part = rng.choice("+-") + _expression(rng, 0, 1)
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(LETTERS) for _ in range(rng.randint(1, 10)))
+
+
+def _json_value(rng: random.Random, depth: int) -> str:
+    roll = rng.random()
+    if depth < 3 and roll < 0.15:
+        return "{" + ",".join('"{}":{}'.format(_word(rng), _json_value(rng, depth + 1))
+                              for _ in range(rng.randint(0, 5))) + "}"
+    elif depth < 3 and roll < 0.25:
+        return "[" + ",".join(_json_value(rng, depth + 1) for _ in range(rng.randint(0, 5))) + "]"
+    elif roll < 0.55:
+        return '"' + " ".join(_word(rng) for _ in range(rng.randint(1, 4))) + '"'
+    elif roll < 0.85:
+        return "-" * rng.randint(0, 1) + _number(rng) + ("." + _number(rng) if rng.random() < 0.3 else "")
+    return rng.choice(["true", "false", "null"])
+
+
+def json(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    items = []
+    length = 2
+    while length < size:
+        item = _json_value(rng, 1)
+        items.append(item)
+        length += len(item) + 1
+    return "[" + ",".join(items) + "]"
+
+
+def _identifier(rng: random.Random) -> str:
+    return rng.choice(LETTERS) + "".join(rng.choice(LETTERS + string.digits) for _ in range(rng.randint(0, 8)))
+
+
+def _choice(rng: random.Random, depth: int) -> str:
+    return "|".join(_sequence(rng, depth) for _ in range(rng.randint(1, 4)))
+
+
+def _sequence(rng: random.Random, depth: int) -> str:
+    parts = []
+    previous_identifier = False
+    for _ in range(rng.randint(1, 5)):
+        roll = rng.random()
+        if depth < 2 and roll < 0.15:
+            part = "(" + _choice(rng, depth + 1) + ")"
+            previous_identifier = False
+        elif roll < 0.55 and not previous_identifier:
+            # Identifiers are never adjacent, as there is no whitespace between them
+            part = _identifier(rng)
+            previous_identifier = True
+        else:
+            part = '"' + _word(rng) + '"'
+            previous_identifier = False
+        if rng.random() < 0.2:
+            part += rng.choice("*+?")
+        parts.append(part)
+    return "".join(parts)
+
+
+def meta(size: int, seed: int = 0) -> str:
+    """A grammar, which both the grammar parser and the generated meta-grammar parser accept."""
+    rng = random.Random(seed)
+    rules = []
+    length = 0
+    while length < size:
+        rule = "{}={};".format(_identifier(rng), _choice(rng, 0))
+        rules.append(rule)
+        length += len(rule)
+    return "".join(rules)
+
+
+def keywords(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    items = []
+    length = 0
+    while length < size:
+        item = rng.choice(KEYWORD_LIST) + ";"
+        items.append(item)
+        length += len(item)
+    return "".join(items)
+
+
+CORPORA = {
+    "arithmetic": arithmetic,
+    "json": json,
+    "json-classes": json,
+    "keywords": keywords,
+    "meta": meta,
+}
@@ -0,0 +1,72 @@
+"""
+Grammars used by the benchmark suite, in laggard's grammar syntax.
+"""
+
+DIGITS = " | ".join('"{}"'.format(d) for d in "0123456789")
+LETTERS = " | ".join('"{}"'.format(c) for c in "abcdefghijklmnopqrstuvwxyz")
+
+#: Arithmetic expressions, as in examples/expressions.py
+ARITHMETIC = """
+start = expr;
+expr = term (("+" | "-") term)*;
+term = factor (("*" | "/") factor)*;
+factor = "(" expr ")" | number | "-" factor;
+number = digit+;
+digit = {digits};
+""".format(digits=DIGITS)
+
+JSON = """
+start = value;
+value = object | array | string | number | "true" | "false" | "null";
+object = "{{" (member ("," member)*)? "}}";
+member = string ":" value;
+array = "[" (value ("," value)*)? "]";
+string = '"' char* '"';
+char = {letters} | " ";
+number = "-"? digit+ ("." digit+)?;
+digit = {digits};
+""".format(letters=LETTERS, digits=DIGITS)
+
+#: JSON, with character classes in place of the choices of single characters
+JSON_CLASSES = """
+start = value;
+value = object | array | string | number | "true" | "false" | "null";
+object = "{" (member ("," member)*)? "}";
+member = string ":" value;
+array = "[" (value ("," value)*)? "]";
+string = '"' [a-z ]* '"';
+number = "-"? [0-9]+ ("." [0-9]+)?;
+"""
+
+#: The grammar syntax itself, without whitespace
+META = """
+start = rule+;
+rule = identifier "=" choice ";";
+choice = sequence ("|" sequence)*;
+sequence = item+;
+item = primary ("*" | "+" | "?")?;
+primary = "(" choice ")" | identifier | string | "~";
+identifier = letter (letter | digit)*;
+string = '"' letter* '"';
+letter = {letters};
+digit = {digits};
+""".format(letters=LETTERS, digits=DIGITS)
+
+#: Python's keywords, as a choice of literals
+KEYWORD_LIST = ["False", "None", "True", "and", "as", "assert", "async", "await", "break", "class", "continue", "def",
+                "del", "elif", "else", "except", "finally", "for", "from", "global", "if", "import", "in", "is",
+                "lambda", "nonlocal", "not", "or", "pass", "raise", "return", "try", "while", "with", "yield"]
+
+#: Sorted longest first, so that no keyword is hidden by one which is a prefix of it
+KEYWORDS = """
+start = (keyword ";")+;
+keyword = {keywords};
+""".format(keywords=" | ".join('"{}"'.format(k) for k in sorted(KEYWORD_LIST, key=lambda k: (-len(k), k))))
+
+GRAMMARS = {
+    "arithmetic": ARITHMETIC,
+    "json": JSON,
+    "json-classes": JSON_CLASSES,
+    "keywords": KEYWORDS,
+    "meta": META,
+}
@@ -0,0 +1,201 @@
+"""
+Benchmarks the parser toolchain: loading grammars with :class:`laggard.grammar_parser.Parser`,
+generating code with :class:`laggard.codegen.CodeGenerator`, and running the generated parsers,
+on inputs from 1 KB up to 100 MB.
+
+Each result records chars/s, peak memory (measured with tracemalloc, in a separate run) and the
+number of times the buffer backtracked. Results are written as JSON, and can be compared with an
+earlier run to spot regressions::
+
+    python -m benchmarks.suite --output before.json
+    # ... change things ...
+    python -m benchmarks.suite --output after.json --compare before.json
+
+By default inputs stop at 1 MB; pass `--max-size 100M` for the full range.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import laggard
+from laggard import grammar_parser
+from laggard.buffer import Buffer
+from laggard.codegen import CodeGenerator
+from laggard.main import compile_grammar
+
+from benchmarks.corpora import CORPORA
+from benchmarks.grammars import GRAMMARS
+
+SIZES = [1 << 10, 10 << 10, 100 << 10, 1 << 20, 10 << 20, 100 << 20]
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+class CountingBuffer(Buffer):
+    """Counts how often the parser backtracks."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.backtracks = 0
+
+    def abandon(self):
+        self.backtracks += 1
+        super().abandon()
+
+
+class CountingGrammarParser(grammar_parser.Parser):
+    def __init__(self, source: str):
+        super().__init__(source)
+        self.buffer = CountingBuffer(source, skip=self.buffer.skip)
+
+
+def parse_size(text: str) -> int:
+    text = text.upper().rstrip("B")
+    if text[-1:] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def measure(run, size: int, memory: bool) -> dict:
+    """Times `run`, which returns the number of backtracks, and optionally measures its peak memory in a second run."""
+    gc.collect()
+    start = time.perf_counter()
+    backtracks = run()
+    seconds = time.perf_counter() - start
+    result = {
+        "size": size,
+        "seconds": seconds,
+        "chars_per_sec": size / seconds if seconds else None,
+        "backtracks": backtracks,
+        "peak_memory": None,
+    }
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def bench_grammar_loading(sizes, memory):
+    for size in sizes:
+        source = CORPORA["meta"](size)
+
+        def run():
+            parser = CountingGrammarParser(source)
+            parser.parse()
+            return parser.buffer.backtracks
+
+        yield dict(stage="grammar_loading", grammar="meta", **measure(run, len(source), memory))
+
+
+def bench_codegen(sizes, memory):
+    for name, grammar in GRAMMARS.items():
+        tree = grammar_parser.Parser(grammar).parse()
+        yield dict(stage="codegen", grammar=name,
+                   **measure(lambda: CodeGenerator(tree).generate() and 0, len(grammar), memory))
+    for size in sizes:
+        # Large, generated grammars
+        source = CORPORA["meta"](size)
+        tree = grammar_parser.Parser(source).parse()
+        yield dict(stage="codegen", grammar="meta-corpus",
+                   **measure(lambda: CodeGenerator(tree).generate() and 0, len(source), memory))
+
+
+def bench_execution(sizes, memory, options):
+    for name, grammar in GRAMMARS.items():
+        parser_class = compile_grammar(grammar, use_cache=False, **options)
+
+        class Counting(parser_class):
+            def _get_buffer(self, source):
+                return CountingBuffer(source)
+
+        for size in sizes:
+            source = CORPORA[name](size)
+
+            def run():
+                parser = Counting(source)
+                parser.parse()
+                return parser.buffer.backtracks
+
+            yield dict(stage="execution", grammar=name, **measure(run, len(source), memory))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _key(result):
+    return result["stage"], result["grammar"], result["size"]
+
+
+def format_result(result, baseline=None) -> str:
+    line = "{:<16} {:<12} {:>10} {:>14} {:>12} {:>10}".format(
+        result["stage"], result["grammar"], result["size"],
+        "{:.0f}".format(result["chars_per_sec"] or 0),
+        result["peak_memory"] if result["peak_memory"] is not None else "-",
+        result["backtracks"])
+    if baseline is not None and baseline.get("chars_per_sec") and result["chars_per_sec"]:
+        line += " {:>+8.1%}".format(result["chars_per_sec"] / baseline["chars_per_sec"] - 1)
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-size", default="1M", help="largest input, e.g. 100M (default 1M)")
+    parser.add_argument("--stage", action="append", choices=["grammar_loading", "codegen", "execution"],
+                        help="only run the given stages")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory runs")
+    parser.add_argument("--packrat", action="store_true", help="generate packrat parsers")
+    parser.add_argument("--failure-mode", default="sentinel", choices=["sentinel", "exception"])
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a JSON file of earlier results, to compare throughput with")
+    args = parser.parse_args(argv)
+
+    sizes = [size for size in SIZES if size <= parse_size(args.max_size)]
+    stages = args.stage or ["grammar_loading", "codegen", "execution"]
+    options = {"packrat": args.packrat, "failure_mode": args.failure_mode}
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {_key(result): result for result in json.load(f)["results"]}
+
+    print("{:<16} {:<12} {:>10} {:>14} {:>12} {:>10}".format(
+        "stage", "grammar", "size", "chars/s", "peak bytes", "backtracks"))
+    results = []
+    benches = {
+        "grammar_loading": lambda: bench_grammar_loading(sizes, not args.no_memory),
+        "codegen": lambda: bench_codegen(sizes, not args.no_memory),
+        "execution": lambda: bench_execution(sizes, not args.no_memory, options),
+    }
+    for stage in stages:
+        for result in benches[stage]():
+            results.append(result)
+            print(format_result(result, baseline.get(_key(result))))
+            sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "laggard_version": laggard.__version__,
+                "python": platform.python_version(),
+                "options": options,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
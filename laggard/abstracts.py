@@ -1,37 +1,134 @@
-from typing import List, Callable
+from typing import List, Callable, Optional, FrozenSet, Tuple, Union
 
 from laggard import Buffer
-from laggard.exceptions import ParseException
+from laggard.buffer import BytesBuffer
+from laggard.exceptions import ParseException, ExpectationException, Terminal
 from laggard import helpers
+from laggard.helpers import FAIL
+from laggard.memo import MemoTable, EditedMemoTable, create_memo
+from laggard.profiling import Profile
 
 class Parser:
+    #: The memo table policy used by rules decorated with :func:`~laggard.memo.memoize`.
+    memo_policy: str = "unbounded"
+    #: Passed on to :func:`~laggard.memo.create_memo`.
+    memo_size: int = None
+    #: Whether the parser records a :class:`~laggard.profiling.Profile`; set by generated parsers with profiling.
+    profiling: bool = False
+    #: Whether results may hold offsets into the input, which :meth:`edit` moves when it reuses them; generated
+    #: parsers whose results are only strings, lists and tuples of them, and None clear it.
+    results_hold_offsets: bool = True
+
     def __init__(self, source: str):
         self.source = source
         self.buffer = self._get_buffer(source)
+        self.memo = self._get_memo()
+        self.profile = self._get_profile()
         self.stack: List[str] = []
-        self.error_stack: List[ParseException] = []
         self._mark_name: str = None
 
     def _get_buffer(self, source:str) -> Buffer:
         return Buffer(source)
 
+    def _get_memo(self) -> MemoTable:
+        return create_memo(self.memo_policy, self.buffer, self.memo_size)
+
+    @classmethod
+    def parse_batch(cls, documents, **kwargs):
+        """Parses many documents in a pool of processes, see :func:`laggard.batch.parse_batch`."""
+        from laggard.batch import parse_batch
+        return parse_batch(cls, documents, **kwargs)
+
+    def _get_profile(self) -> Optional[Profile]:
+        return Profile() if self.profiling else None
+
     def parse(self):
         """
         Begin the parse.
         If the parse is unsuccessful, it will throw ParseException.
         Ensures that the end of the string provided is reached.
 
+        The error reports the farthest point in the input which the parser reached, and every terminal it expected
+        there, rather than the last terminal which did not match; see :meth:`failure`.
+        Whether or not it succeeds, the buffer is closed afterwards, releasing any file it reads.
+
         Returns:
             The result of the start rule.
         """
-        result = self.parse_start()
-        if not self.buffer.is_eof():
-            raise ParseException("Did not consume whole file.")
-        return result
+        try:
+            try:
+                result = self.parse_start()
+            except ExpectationException:
+                raise self.failure("Failed to parse: start did not match") from None
+            if result is FAIL:
+                raise self.failure("Failed to parse: start did not match")
+            if not self.buffer.is_eof():
+                raise self.failure("Did not consume whole file, stopped")
+            return result
+        finally:
+            self.buffer.close()
 
     def parse_start(self):
         raise NotImplementedError
 
+    def failure(self, message: str) -> ParseException:
+        """
+        The error for a parse which stopped at the buffer's position: the farthest failure of a terminal
+        the buffer recorded, if it is there or beyond, or else a ParseException with the message and position.
+        """
+        buffer = self.buffer
+        if buffer.failure_index >= buffer.offset + buffer.current_index:
+            return ExpectationException(buffer, buffer.failure_index, frozenset(buffer.expected))
+        return ParseException("{} at {}".format(message, buffer.current_pos))
+
+    def edit(self, offset: int, deleted: int, inserted: str) -> "Parser":
+        """
+        Creates a parser for this parser's source after an edit, which reuses the results memoized by this parser
+        for the parts of the source the edit does not affect, so only those it does are parsed again.
+        Results are only memoized by parsers generated in packrat mode.
+
+        Examples:
+            To replace the 3 characters at index 100 with "xyz"::
+
+                parser.parse()
+                parser = parser.edit(100, 3, "xyz")
+                parser.parse()
+
+        Args:
+            offset: Where the edit begins.
+            deleted: The number of characters removed there.
+            inserted: The text inserted there.
+
+        Returns:
+            A new parser, which has not parsed yet.
+        """
+        parser = type(self)(self.source[:offset] + inserted + self.source[offset + deleted:])
+        parser.memo = EditedMemoTable(self.memo, parser.memo, offset, deleted, len(inserted),
+                                      self.results_hold_offsets)
+        return parser
+
+    def cut(self):
+        """
+        Commits to the innermost choice alternative, optional or repetition item, by dropping its mark from the buffer.
+        When no marks remain, nothing before the current position can be parsed again, so the memo table drops it.
+        """
+        self.buffer.commit()
+        if not self.buffer.stack:
+            self.memo.prune(self.buffer.offset + self.buffer.current_index)
+
+    def expected_first(self, index: int, lookahead: str, terminals: Tuple[Terminal, ...]):
+        """
+        Records, for a choice, the terminal expected by each alternative which is not tried, because the lookahead
+        character is not one it can begin with. Which those are is only worked out if the parse fails there,
+        see :func:`~laggard.exceptions.ruled_out`. Used by generated parsers, before trying the alternatives.
+
+        Args:
+            index: The index of the lookahead character in the buffer.
+            lookahead: The character, which is empty at the end of the input.
+            terminals: The terminal each alternative which lookahead can rule out begins with.
+        """
+        self.buffer.expected_at(index, (lookahead, terminals))
+
     def expect(self, literal:str):
         """
         Attempts to parse the given literal. Will skip until the first char, and then no more.
@@ -44,6 +141,70 @@ class Parser:
         """
         return helpers.expect(self.buffer, literal)
 
+    def match(self, literal: str):
+        """
+        Like :meth:`expect`, but returns :data:`~laggard.helpers.FAIL` rather than raising if the literal is not there.
+
+        Args:
+            literal: The literal to match
+
+        Returns:
+            The literal matched, or FAIL
+        """
+        return helpers.match(self.buffer, literal)
+
+    def expect_class(self, charset: FrozenSet[str], negated: bool = False):
+        """
+        Attempts to parse a character of a character class. Will skip until the character.
+
+        Args:
+            charset: The characters of the class
+            negated: Whether to accept the characters not in charset instead
+
+        Returns:
+            The char matched
+        """
+        return helpers.expect_class(self.buffer, charset, negated)
+
+    def match_class(self, charset: FrozenSet[str], negated: bool = False):
+        """Like :meth:`expect_class`, but returns :data:`~laggard.helpers.FAIL` rather than raising."""
+        return helpers.match_class(self.buffer, charset, negated)
+
+    def expect_literals(self, table: helpers.LiteralTable):
+        """
+        Attempts to parse the first of a choice's literals which the input holds. Will skip until the first char.
+
+        Args:
+            table: The literals, in order, by their first character
+
+        Returns:
+            The literal matched
+        """
+        return helpers.expect_literals(self.buffer, table)
+
+    def match_literals(self, table: helpers.LiteralTable):
+        """Like :meth:`expect_literals`, but returns :data:`~laggard.helpers.FAIL` rather than raising."""
+        return helpers.match_literals(self.buffer, table)
+
+    def expect_run(self, charset: FrozenSet[str], negated: bool = False, required: bool = False, build: bool = True):
+        """
+        Attempts to parse as many characters of a character class as follow each other.
+
+        Args:
+            charset: The characters of the class
+            negated: Whether to accept the characters not in charset instead
+            required: Whether it raises if it cannot parse even 1 character
+            build: Whether to return the characters parsed, rather than None
+
+        Returns:
+            A list of the chars matched
+        """
+        return helpers.expect_run(self.buffer, charset, negated, required, build)
+
+    def match_run(self, charset: FrozenSet[str], negated: bool = False, required: bool = False, build: bool = True):
+        """Like :meth:`expect_run`, but returns :data:`~laggard.helpers.FAIL` rather than raising."""
+        return helpers.match_run(self.buffer, charset, negated, required, build)
+
     def expectOneOf(self, charset: List[str], skip: bool = True):
         """
         Attempts to parse a character from charset.
@@ -57,18 +218,19 @@ class Parser:
         """
         return helpers.expectOneOf(self.buffer, charset, skip)
 
-    def expectManyOutOf(self, charset: List[str]):
+    def expectManyOutOf(self, charset: List[str], span: bool = False):
         """
         Attempts to greedily parse characters from charset. It will parse at least one, or error.
         It will skip the specified chars until the first matching character, and then it will cease skipping.
 
         Args:
             charset: The characters to accept
+            span: Whether to return a :class:`~laggard.buffer.Span` rather than a string.
 
         Returns:
             A string of the characters it managed to parse.
         """
-        return helpers.expectManyOutOf(self.buffer, charset)
+        return helpers.expectManyOutOf(self.buffer, charset, span)
 
     def parseMultipleOf(self, parser: Callable, accept_none: bool = False):
         """
@@ -83,16 +245,17 @@ class Parser:
         """
         return helpers.parseMultipleOf(self.buffer, parser, accept_none)
 
-    def parseUntil(self, charset: List[str]):
+    def parseUntil(self, charset: List[str], span: bool = False):
         """
         Parses characters until it finds a character in charset
         Args:
             charset: The characters to look out for
+            span: Whether to return a :class:`~laggard.buffer.Span` rather than a string.
 
         Returns:
             A string of all characters parsed
         """
-        return helpers.parseUntil(self.buffer, charset)
+        return helpers.parseUntil(self.buffer, charset, span)
 
     def __call__(self, name: str):
         """
@@ -113,9 +276,32 @@ class Parser:
         self._mark_name = None
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stack.pop()
         if exc_type is not None:
-            self.error_stack.append()
             self.buffer.abandon()
         else:
             self.buffer.commit()
 
+
+class BinaryParser(Parser):
+    """
+    A parser of binary input, like a network protocol: bytes, a bytearray or a memoryview, read by a
+    :class:`~laggard.buffer.BytesBuffer`. Literals are bytes, character classes hold byte values, and the text a rule
+    matches is a memoryview of the input, rather than a copy. Generated by :class:`~laggard.codegen.CodeGenerator`
+    with `binary`.
+    """
+
+    def _get_buffer(self, source: Union[bytes, bytearray, memoryview]) -> BytesBuffer:
+        return BytesBuffer(source)
+
+    def expect(self, literal: bytes):
+        return helpers.expect_bytes(self.buffer, literal)
+
+    def match(self, literal: bytes):
+        return helpers.match_bytes(self.buffer, literal)
+
+    def expect_run(self, charset: FrozenSet[int], negated: bool = False, required: bool = False, build: bool = True):
+        return helpers.expect_byte_run(self.buffer, charset, negated, required, build)
+
+    def match_run(self, charset: FrozenSet[int], negated: bool = False, required: bool = False, build: bool = True):
+        return helpers.match_byte_run(self.buffer, charset, negated, required, build)
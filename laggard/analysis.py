@@ -0,0 +1,155 @@
+from collections import namedtuple
+from typing import Dict, FrozenSet, List, Optional
+
+from laggard.grammar_asts import Grammar, Combined, Choice, ModifiedRuleExpression, LabelledRuleExpression, Identifier, \
+    Literal, Cut, CharacterClass
+
+#: Stands in a FIRST set for "any character", where a rule is not defined in the grammar.
+ANY = None
+
+#: The most characters a character class adds to a FIRST set; larger classes, and negated ones, may begin with anything.
+MAX_CLASS_FIRST = 128
+
+#: The transformer which makes a rule return the text it matched.
+TEXT = "text"
+#: The transformer which makes a rule return None, so that its result is never built.
+DISCARD = "discard"
+
+ChoiceConflict = namedtuple("ChoiceConflict", ["rule", "choice", "alternatives", "overlap"])
+"""
+A choice which the lookahead character cannot always decide.
+`alternatives` are the indices of the alternatives which must still be tried in turn, and `overlap` the characters
+which more than one of them may begin with (it contains :data:`ANY` if one may begin with anything).
+"""
+
+
+def _rule_name(rule) -> str:
+    return rule.name.name if isinstance(rule.name, Identifier) else rule.name
+
+
+def has_cut(node) -> bool:
+    """Whether a cut in the node applies to the scope around it, rather than one within it."""
+    if isinstance(node, Cut):
+        return True
+    elif isinstance(node, Combined):
+        return any(has_cut(child) for child in node.children)
+    elif isinstance(node, LabelledRuleExpression):
+        return has_cut(node.expr)
+    return False
+
+
+class GrammarAnalysis:
+    """
+    Computes which rules and expressions of a grammar can match the empty string (nullability),
+    and the characters each can begin with (its FIRST set).
+
+    Examples:
+        To find the choices of a grammar that need backtracking::
+
+            analysis = GrammarAnalysis(grammar_parser.Parser(source).parse())
+            for conflict in analysis.conflicts():
+                print(conflict.rule, conflict.overlap)
+    """
+
+    def __init__(self, root: Grammar):
+        self.root = root
+        self.rules = {_rule_name(rule): rule.content for rule in root.children}
+        self.nullable: Dict[str, bool] = {name: False for name in self.rules}
+        self.first: Dict[str, FrozenSet[Optional[str]]] = {name: frozenset() for name in self.rules}
+        self._solve()
+
+    def _solve(self):
+        # Both properties only grow, so iterate until neither changes
+        changed = True
+        while changed:
+            changed = False
+            for name, expr in self.rules.items():
+                nullable = self.is_nullable(expr)
+                first = self.first_of(expr)
+                if nullable != self.nullable[name] or first != self.first[name]:
+                    self.nullable[name] = nullable
+                    self.first[name] = first
+                    changed = True
+
+    def is_nullable(self, node) -> bool:
+        """Whether the expression can match without consuming anything."""
+        if isinstance(node, Literal):
+            return not node.value
+        elif isinstance(node, Identifier):
+            return self.nullable.get(node.name, True)
+        elif isinstance(node, Combined):
+            return all(self.is_nullable(child) for child in node.children)
+        elif isinstance(node, Choice):
+            return any(self.is_nullable(child) for child in node.children)
+        elif isinstance(node, ModifiedRuleExpression):
+            return node.modifier in ("?", "*") or self.is_nullable(node.expr)
+        elif isinstance(node, LabelledRuleExpression):
+            return self.is_nullable(node.expr)
+        elif isinstance(node, Cut):
+            return True
+        elif isinstance(node, CharacterClass):
+            return False
+        return True
+
+    def first_of(self, node) -> FrozenSet[Optional[str]]:
+        """The characters that the expression can begin with, ignoring the buffer's skipped characters."""
+        if isinstance(node, Literal):
+            return frozenset(node.value[:1])
+        elif isinstance(node, Identifier):
+            return self.first.get(node.name, frozenset([ANY]))
+        elif isinstance(node, Combined):
+            first = frozenset()
+            for child in node.children:
+                first |= self.first_of(child)
+                if not self.is_nullable(child):
+                    break
+            return first
+        elif isinstance(node, Choice):
+            return frozenset().union(*(self.first_of(child) for child in node.children))
+        elif isinstance(node, (ModifiedRuleExpression, LabelledRuleExpression)):
+            return self.first_of(node.expr)
+        elif isinstance(node, Cut):
+            return frozenset()
+        elif isinstance(node, CharacterClass):
+            chars = node.chars
+            if node.negated or len(chars) > MAX_CLASS_FIRST:
+                return frozenset([ANY])
+            return chars
+        return frozenset([ANY])
+
+    def is_predictable(self, node) -> bool:
+        """Whether the lookahead character can rule the expression out, that is, it is not nullable and has a known FIRST set."""
+        return not self.is_nullable(node) and ANY not in self.first_of(node)
+
+    def choices(self):
+        """Yields each rule name and choice node in the grammar."""
+        for name, expr in self.rules.items():
+            stack = [expr]
+            while stack:
+                node = stack.pop()
+                if isinstance(node, Choice):
+                    yield name, node
+                if isinstance(node, (Combined, Choice)):
+                    stack.extend(reversed(node.children))
+                elif isinstance(node, (ModifiedRuleExpression, LabelledRuleExpression)):
+                    stack.append(node.expr)
+
+    def conflicts(self) -> List[ChoiceConflict]:
+        """The choices which stay non-deterministic after lookahead on the next character."""
+        conflicts = []
+        for name, choice in self.choices():
+            seen = {}
+            overlap = set()
+            for i, alternative in enumerate(choice.children):
+                chars = self.first_of(alternative) if self.is_predictable(alternative) else frozenset([ANY])
+                for c in chars:
+                    seen.setdefault(c, []).append(i)
+            alternatives = set()
+            for c, indices in seen.items():
+                if len(indices) > 1 or (ANY in seen and len(seen) > 1):
+                    overlap.add(c)
+                    alternatives.update(indices)
+                    alternatives.update(seen.get(ANY, []))
+            if overlap:
+                conflicts.append(ChoiceConflict(name, choice, sorted(alternatives), frozenset(overlap)))
+        return conflicts
@@ -1,9 +1,28 @@
-import textwrap
+import io
+import json
+from typing import TextIO
+
+from laggard.infoholders import ParseInfo, TextPosition
 
 
 class ASTNode:
-    def __init__(self, children):
-        self.children = children
+    """
+    A node of a syntax tree. Nodes use `__slots__`, and each part is stored once: subclasses name their parts in
+    `_fields`, and `children` is built from those on demand.
+
+    `start` and `end` are the offsets in the whole input of the text the node was parsed from, or None if the node
+    was built by hand. Positions are derived from them when asked for, see :meth:`get_position`.
+    """
+
+    __slots__ = ("start", "end")
+    #: The attributes holding the parts of the node, in order.
+    _fields = ()
+    #: Other attributes describing the node, which are included when it is serialized.
+    _properties = ()
+
+    def __init__(self, start: int = None, end: int = None):
+        self.start = start
+        self.end = end
 
     def __str__(self):
         return self.get_pretty_string()
@@ -11,25 +30,98 @@ class ASTNode:
     def __repr__(self):
         return "<{}>".format(self.get_name())
 
+    @property
+    def children(self):
+        return [getattr(self, field) for field in self._fields]
+
     def get_name(self):
         return self.__class__.__name__
 
     def get_children(self):
         return self.children
 
+    def get_position(self, buffer) -> TextPosition:
+        """The (line number, column number) where the node starts, in the given buffer's input."""
+        return buffer._get_position_from_index(self.start - buffer.offset)
+
+    def get_parse_info(self, buffer) -> ParseInfo:
+        """The position, length and text of the node, in the given buffer's input."""
+        line_number, column_number = self.get_position(buffer)
+        start = self.start - buffer.offset
+        return ParseInfo(self.start, line_number, column_number, self.end - self.start,
+                         buffer.source[start:start + self.end - self.start])
+
+    def walk(self, depth=-1):
+        """
+        Yields (level, item) for this node and everything below it, in order, where `level` is the number of nodes
+        above the item. The tree is walked with an explicit stack, so its depth is not limited by recursion.
+
+        Args:
+            depth: How many levels below this node to descend, or -1 for all of them.
+        """
+        stack = [(0, self)]
+        while stack:
+            level, item = stack.pop()
+            yield level, item
+            if isinstance(item, ASTNode) and (depth == -1 or level < depth):
+                stack.extend((level + 1, child) for child in reversed(item.children))
+
+    def write_pretty(self, out: TextIO, depth=-1):
+        """
+        Writes the tree to `out` as an indented outline, one node per line, in time linear in the size of the output.
+        Items which are not nodes are written with `repr`.
+        """
+        first = True
+        for level, item in self.walk(depth):
+            text = item.get_name() if isinstance(item, ASTNode) else repr(item)
+            for line in text.split("\n"):
+                if not first:
+                    out.write("\n")
+                first = False
+                if line.strip():
+                    out.write("  " * level)
+                out.write(line)
+
     def get_pretty_string(self, depth=-1):
-        ret_str = self.get_name()
-        if depth > 0 or depth == -1:
-            if depth == -1:
-                next_depth = -1
-            else:
-                next_depth = depth - 1
-            children_str = ""
-            for child in self.children:
-                children_str += "\n"
-                if isinstance(child, ASTNode):
-                    children_str += child.get_pretty_string(depth=next_depth)
-                else:
-                    children_str += repr(child)
-            ret_str += textwrap.indent(children_str, " " * 2)
-        return ret_str
+        out = io.StringIO()
+        self.write_pretty(out, depth)
+        return out.getvalue()
+
+    def to_dict(self) -> dict:
+        """
+        The node, without its child nodes, as a dictionary of JSON values:
+        its type, offsets, and any parts of it which are not nodes, including lists of plain values.
+        """
+        values = {"type": self.__class__.__name__, "start": self.start, "end": self.end}
+        for field in self._fields + self._properties:
+            value = getattr(self, field)
+            if field in self._properties and isinstance(value, ASTNode):
+                values[field] = value.to_dict()
+            elif isinstance(value, (list, tuple)):
+                # Lists of child nodes are written as the nodes themselves, lists of plain values as a JSON array
+                if not any(isinstance(item, ASTNode) for item in value):
+                    values[field] = value
+            elif not isinstance(value, ASTNode):
+                values[field] = value
+        return values
+
+    def write_json_lines(self, out: TextIO, depth=-1):
+        """
+        Writes the tree to `out` as JSON lines: one compact object per node, in order, from :meth:`to_dict`
+        with the node's `level` added. The tree can be rebuilt from the levels, and dumps diff line by line.
+        """
+        for level, item in self.walk(depth):
+            if isinstance(item, ASTNode):
+                values = item.to_dict()
+                values["level"] = level
+                out.write(json.dumps(values, separators=(",", ":")))
+                out.write("\n")
+
+class ListNode(ASTNode):
+    """A node whose parts are an arbitrary number of children."""
+
+    __slots__ = ("children",)
+
+    def __init__(self, children, start: int = None, end: int = None):
+        super().__init__(start, end)
+        self.children = children
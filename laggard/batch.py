@@ -0,0 +1,244 @@
+import io
+import itertools
+import os
+import re
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator, Pattern, Type, Union
+
+from laggard.abstracts import Parser
+from laggard.infoholders import TextPosition
+from laggard.main import compile_grammar
+
+BatchResult = namedtuple("BatchResult", ["index", "path", "result", "error"])
+"""
+The outcome of parsing one document of a batch: its index in the input, its path (None if the source was given),
+and either the parse result, or the exception raised while reading or parsing it.
+"""
+
+#: The parser class of a worker process, compiled (or loaded from the cache) once, when the worker starts.
+_worker_parser: Type[Parser] = None
+
+
+def _initialize(grammar: str, options: dict, subclass: Type[Parser] = None):
+    global _worker_parser
+    _worker_parser = compile_grammar(grammar, **options)
+    if subclass is not None:
+        _worker_parser = subclass
+
+
+def _parse_chunk(chunk, paths: bool, encoding: str):
+    results = []
+    for index, document in chunk:
+        path = document if paths else None
+        try:
+            if paths:
+                with open(document, encoding=encoding) as f:
+                    document = f.read()
+            results.append(BatchResult(index, path, _worker_parser(document).parse(), None))
+        except Exception as e:
+            results.append(BatchResult(index, path, None, e))
+    return results
+
+
+def parse_batch(parser: Type[Parser], documents: Iterable[str], paths: bool = False, workers: int = None,
+                ordered: bool = True, chunk_size: int = 64, max_pending: int = None,
+                encoding: str = "utf-8") -> Iterator[BatchResult]:
+    """
+    Parses many independent documents with a pool of processes.
+
+    Documents are sent to the workers in chunks, and at most `max_pending` chunks are read from `documents` but
+    not yet yielded at any time, so a long (or endless) iterable is consumed no faster than it is parsed.
+    A document which fails to parse does not stop the batch: its exception is returned in its result.
+
+    Args:
+        parser: A parser class returned by :func:`~laggard.main.compile_grammar`, which each worker compiles
+            once (normally just loading it from the cache), or a subclass of one defined at the top level of a module,
+            which each worker imports.
+        documents: The sources to parse, or with `paths`, the paths of the files to parse.
+        paths: Whether `documents` are paths, read by the workers.
+        workers: The number of processes, by default the number of CPUs.
+        ordered: Whether results are yielded in the order of `documents`, rather than as they are completed.
+        chunk_size: The number of documents sent to a worker at once.
+        max_pending: The number of chunks in flight, by default twice the number of workers.
+        encoding: The encoding of the files, with `paths`.
+
+    Returns:
+        An iterator of :class:`BatchResult`
+    """
+    return _run(_initargs(parser), workers, max_pending, ordered,
+                ((_parse_chunk, chunk, paths, encoding) for chunk in _chunks(documents, chunk_size)))
+
+
+def _initargs(parser: Type[Parser]) -> tuple:
+    try:
+        initargs = parser.grammar, parser.grammar_options
+    except AttributeError:
+        raise ValueError("Parsers must be created by compile_grammar to be run in worker processes") from None
+    if "grammar" in vars(parser):
+        return initargs
+    # A subclass, with its own transformers or buffer, is sent to the workers by its module and name
+    module = sys.modules.get(parser.__module__)
+    if "<locals>" in parser.__qualname__ or getattr(module, parser.__qualname__, None) is not parser:
+        raise ValueError("The parser class {} must be defined at the top level of a module, "
+                         "so that worker processes can import it".format(parser.__qualname__))
+    return initargs + (parser,)
+
+
+def _chunks(documents: Iterable[str], chunk_size: int):
+    documents = enumerate(documents)
+    while True:
+        chunk = list(itertools.islice(documents, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run(initargs: tuple, workers: int, max_pending: int, ordered: bool, tasks) -> Iterator:
+    """
+    Runs each (function, arguments...) of `tasks` in a pool of workers initialized with `initargs`,
+    with at most `max_pending` tasks read but not yet yielded at any time, and yields the items of their results.
+    """
+    workers = workers or os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * workers
+    with ProcessPoolExecutor(workers, initializer=_initialize, initargs=initargs) as pool:
+        pending = {}
+        # Completed tasks waiting for an earlier one, when ordered
+        completed = {}
+        submitted = 0
+        next_task = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) + len(completed) < max_pending:
+                    task = next(tasks, None)
+                    if task is None:
+                        exhausted = True
+                        break
+                    pending[pool.submit(*task)] = submitted
+                    submitted += 1
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    number = pending.pop(future)
+                    if ordered:
+                        completed[number] = future.result()
+                    else:
+                        yield from future.result()
+                while next_task in completed:
+                    yield from completed.pop(next_task)
+                    next_task += 1
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _parse_part(text: str, offset: int, position: TextPosition):
+    parser = _worker_parser(text)
+    parser.buffer.set_origin(offset, position)
+    try:
+        return [(parser.parse(), None)]
+    except Exception as e:
+        return [(None, e)]
+
+
+def _split(reader, sync: Pattern, chunk_size: int):
+    """
+    Yields (text, offset, (line number, column number)) for the parts of the input read from `reader`, each ending
+    just after a match of `sync` (except the last).
+
+    The input is read `chunk_size` characters at a time. Each part is what was left over from the previous part,
+    followed by what has been read since, up to the last match of `sync` which ends before the end of it;
+    more is read until there is one. Parts are therefore not of any least length: one can be as short as
+    the text up to the first match in a chunk, and one is longer than `chunk_size` when a chunk has no match.
+
+    Each chunk is searched from `chunk_size` characters before it, rather than from the start of what was left over,
+    so a match which began in the previous chunk is still found, if it is shorter than that; what is left over is
+    only joined into one string once a part ends.
+    """
+    carry = []
+    # The characters read before the chunk which are searched with it, and one more before those, which is
+    # not searched from so that `^` does not match there but is kept for lookbehinds
+    tail = ""
+    read = 0
+    offset = 0
+    line_number, column_number = 1, 1
+    while True:
+        data = reader.read(chunk_size)
+        if data:
+            window = tail + data
+            base = read - len(tail)
+            end = None
+            for match in sync.finditer(window, 1 if base else 0):
+                # A match which reaches the end of what has been read might continue further
+                if base + match.end() > offset and match.end() < len(window):
+                    end = base + match.end() - offset
+            read += len(data)
+            tail = window[-chunk_size - 1:]
+            if end is None:
+                carry.append(data)
+                continue
+        text = "".join(carry) + data
+        if not data:
+            end = len(text)
+        part = text[:end]
+        carry = [text[end:]]
+        if part:
+            # A plain tuple, as TextPosition cannot be pickled
+            yield part, offset, (line_number, column_number)
+        if not data:
+            return
+        offset += len(part)
+        newlines = part.count("\n")
+        if newlines:
+            line_number += newlines
+            column_number = len(part) - part.rfind("\n")
+        else:
+            column_number += len(part)
+
+
+def parse_split(parser: Type[Parser], sync: Union[str, Pattern], source: str = None, path: str = None,
+                workers: int = None, chunk_size: int = 1 << 20, max_pending: int = None,
+                encoding: str = "utf-8") -> list:
+    """
+    Parses one large input in a pool of processes, by splitting it into parts which can be parsed on their own.
+
+    The input is split just after matches of `sync`, a regular expression which must only match between top-level
+    items of the grammar, such as `r";\\s*\\n"` after the rules of a laggard grammar. Each part is parsed by the
+    start rule, with positions (and memo indices) relative to the whole input, so errors report where in the input
+    they occurred. The input is read, and the parts parsed, at most `max_pending` parts ahead of the results.
+
+    Args:
+        parser: A parser class returned by :func:`~laggard.main.compile_grammar`.
+        sync: Where the input may be split.
+        source: The input, unless `path` is given.
+        path: The path of a file to read the input from.
+        workers: The number of processes, by default the number of CPUs.
+        chunk_size: The number of characters read from the input before it is split again, which is roughly
+            the size of a part, see :func:`_split`.
+        max_pending: The number of parts in flight, by default twice the number of workers.
+        encoding: The encoding of the file at `path`.
+
+    Returns:
+        The results of the parts in order: concatenated, if they are lists, as when the start rule is a repetition.
+        The first error, in the order of the input, is raised instead.
+    """
+    initargs = _initargs(parser)
+    if isinstance(sync, str):
+        sync = re.compile(sync)
+    reader = io.StringIO(source) if path is None else io.open(path, encoding=encoding)
+    results = []
+    with reader:
+        parts = _split(reader, sync, chunk_size)
+        for result, error in _run(initargs, workers, max_pending, True,
+                                  ((_parse_part,) + part for part in parts)):
+            if error is not None:
+                raise error
+            if isinstance(result, list):
+                results.extend(result)
+            else:
+                results.append(result)
+    return results
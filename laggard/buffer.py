@@ -1,11 +1,70 @@
+import codecs
+import io
+import mmap
+import re
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import namedtuple
-from typing import List, Union
+from typing import FrozenSet, Iterable, List, Optional, Pattern, Set, Union, TextIO
 
-from laggard.exceptions import ParseException
+from laggard.exceptions import ParseException, Terminal
 from laggard.infoholders import TextPosition
 
 StackEntry = namedtuple("StackEntry", ["pos", "name"])
 
+#: The largest index held by the 4-byte arrays of a buffer's tables; longer sources need 8 bytes an index.
+MAX_NARROW_INDEX = (1 << 31) - 1
+
+
+def _index_array(size: int, values: Iterable[int] = ()) -> array:
+    """An array of indices into a source of `size` characters, of the narrowest type which can hold them."""
+    return array("i" if size <= MAX_NARROW_INDEX else "q", values)
+
+
+class Span:
+    """
+    A part of the input, which refers to the source it was matched in rather than copying it.
+    `start` and `end` are indices in the whole input; `str(span)` gives the text.
+    """
+
+    __slots__ = ("source", "start", "end", "_base")
+
+    def __init__(self, source: str, start: int, end: int, base: int = 0):
+        """
+        Args:
+            source: The string holding the text.
+            start: The index in the whole input where the text begins.
+            end: The index in the whole input just past it.
+            base: The index in the whole input of the beginning of `source`.
+        """
+        self.source = source
+        self.start = start
+        self.end = end
+        self._base = base
+
+    def __str__(self):
+        return self.source[self.start - self._base:self.end - self._base]
+
+    @property
+    def text(self) -> str:
+        return str(self)
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __eq__(self, other):
+        if isinstance(other, Span):
+            return str(self) == str(other)
+        elif isinstance(other, str):
+            return str(self) == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return "Span({!r}, {}, {})".format(str(self), self.start, self.end)
+
 
 class Buffer:
     """
@@ -30,6 +89,10 @@ class Buffer:
 
     """
 
+    #: Returned by :meth:`fetch_char` at the end of the input.
+    EOF = "[EOF]"
+    _NEWLINE = re.compile("\n")
+
     def __init__(self, source: str, skip: List = []):
         """
         Args:
@@ -39,13 +102,152 @@ class Buffer:
         self.source = source
         self.stack: List[int] = []
         self.current_index = 0
+        self._skip_table: array = None
+        self._skipped_source: str = None
         self.skip = skip
+        #: The index in the whole input at which :attr:`source` begins. 0, unless the buffer streams its input,
+        #: or holds a part of it (see :meth:`set_origin`).
+        self.offset = 0
+        # Where the source begins, for reporting positions in the whole input
+        self._lines_before = 0
+        self._columns_before = 0
+        #: An index no lower than that just past every character examined, though not necessarily consumed.
+        #: Memoized rules record how far they looked, so that their results can be reused after an edit.
+        self.reach = 0
+        #: The farthest index in the whole input at which a terminal did not match, or -1 if none has failed.
+        self.failure_index = -1
+        #: The terminals which did not match at :attr:`failure_index`, see :meth:`expected_at`.
+        self.expected: Set[Terminal] = set()
+        self._line_starts: array = None
+        self._indexed_source: str = None
+
+    @property
+    def skip(self) -> FrozenSet[str]:
+        """The characters which the buffer skips."""
+        return self._skip
+
+    @skip.setter
+    def skip(self, skip: Iterable[str]):
+        self._skip = frozenset(skip)
+        self._skip_pattern = self._run_of(self._skip)
+        self._skip_table = None
+
+    @staticmethod
+    def _run_of(chars: FrozenSet[str]) -> Optional[Pattern]:
+        """A pattern matching a run of the characters, or None if there are none."""
+        escaped = "".join(re.escape(c) for c in sorted(chars) if len(c) == 1)
+        return re.compile("[{}]+".format(escaped)) if escaped else None
+
+    @property
+    def skip_table(self) -> array:
+        """
+        For each index of the source (and its end), the index of the first character from there which is not skipped.
+        Built on first use, and again only if the source changes, other than by :meth:`_append`.
+        """
+        if self._skip_table is None or self._skipped_source is not self.source:
+            self._skip_table = self._extend_skip_table(_index_array(len(self.source)), 0)
+            self._skipped_source = self.source
+        return self._skip_table
+
+    def _extend_skip_table(self, table: array, kept: int) -> array:
+        """Adds the entries from index `kept` to the end of the source to a table holding those before it."""
+        source = self.source
+        if table.typecode == "i" and len(source) > MAX_NARROW_INDEX:
+            table = array("q", table)
+        if self._skip_pattern is not None:
+            # Kept characters map to themselves, and each run of skipped characters to the index after it
+            for match in self._skip_pattern.finditer(source, kept):
+                start, end = match.span()
+                table.extend(range(kept, start))
+                if end - start == 1:
+                    table.append(end)
+                else:
+                    table.extend(array(table.typecode, (end,)) * (end - start))
+                kept = end
+        table.extend(range(kept, len(source) + 1))
+        return table
+
+    @property
+    def line_starts(self) -> array:
+        """
+        The index at which each line of the source begins.
+        Built on first use, and again only if the source changes, other than by :meth:`_append`.
+        """
+        if self._line_starts is None or self._indexed_source is not self.source:
+            starts = _index_array(len(self.source), [0])
+            starts.extend(m.end() for m in self._NEWLINE.finditer(self.source))
+            self._line_starts = starts
+            self._indexed_source = self.source
+        return self._line_starts
+
+    def _append(self, text: str):
+        """
+        Adds text to the end of the source, as buffers which read their input as it arrives do. The skip table
+        and line index, if built, are only extended over the text, and the run of skipped characters it may continue.
+        """
+        length = len(self.source)
+        table_current = self._skip_table is not None and self._skipped_source is self.source
+        starts_current = self._line_starts is not None and self._indexed_source is self.source
+        self.source += text
+        if table_current:
+            table = self._skip_table
+            # The run of skipped characters which ended the source, if any, may go on into the text
+            kept = bisect_left(table, length)
+            del table[kept:]
+            self._skip_table = self._extend_skip_table(table, kept)
+            self._skipped_source = self.source
+        if starts_current:
+            starts = self._line_starts
+            if starts.typecode == "i" and len(self.source) > MAX_NARROW_INDEX:
+                starts = array("q", starts)
+            starts.extend(m.end() for m in self._NEWLINE.finditer(self.source, length))
+            self._line_starts = starts
+            self._indexed_source = self.source
+
+    def set_origin(self, offset: int, position: TextPosition):
+        """
+        Declares that the source is a part of a larger input, beginning at `offset` and `position` in it,
+        so that indices in the memo table and reported positions refer to the whole input.
+
+        Args:
+            offset: The index in the whole input of the first character of the source.
+            position: Its (line number, column number), both starting at 1.
+        """
+        line_number, column_number = position
+        self.offset = offset
+        self._lines_before = line_number - 1
+        self._columns_before = column_number - 1
 
     def _get_position_from_index(self, index):
-        # Line number should start at 1
-        line_number = self.source.count("\n", 0, index) + 1
-        column_number = index - self.source.rfind("\n", 0, index)
-        return TextPosition(line_number, column_number)
+        # Line number should start at 1, as should the column
+        line_number = bisect_right(self.line_starts, index)
+        column_number = index - self._line_starts[line_number - 1] + 1
+        if line_number == 1:
+            column_number += self._columns_before
+        return TextPosition(line_number + self._lines_before, column_number)
+
+    def get_index_from_position(self, position: TextPosition) -> int:
+        """
+        The reverse of :attr:`current_pos`; finds the index in the source of a line and column.
+
+        Args:
+            position: A :class:`~laggard.infoholders.TextPosition`, or a (line number, column number) tuple, both starting at 1.
+
+        Returns:
+            The index into the source string
+        """
+        line_number, column_number = position
+        line_number -= self._lines_before
+        if line_number == 1:
+            column_number -= self._columns_before
+        starts = self.line_starts
+        if not 1 <= line_number <= len(starts):
+            raise IndexError("Line {} is out of range".format(line_number))
+        index = starts[line_number - 1] + column_number - 1
+        end = starts[line_number] if line_number < len(starts) else len(self.source) + 1
+        if not 1 <= column_number or index >= end:
+            raise IndexError("Column {} is out of range for line {}".format(column_number, line_number))
+        return index
 
     @property
     def last_pos(self) -> TextPosition:
@@ -60,15 +262,65 @@ class Buffer:
         """The current position of the buffer, as a tuple (line number, column number)"""
         return self._get_position_from_index(self.current_index)
 
+    def fill(self) -> bool:
+        """
+        Extends :attr:`source` with more of the input, for buffers which do not hold it all at once.
+
+        Returns:
+            Whether anything was added.
+        """
+        return False
+
+    def close(self):
+        """Releases whatever the input is read from, once nothing more will be read; a string needs nothing released."""
+
     def fetch_char(self, skip=True) -> str:
+        index = self.current_index
+        if skip and self._skip_pattern is not None:
+            table = self._skip_table
+            if table is None or self._skipped_source is not self.source:
+                table = self.skip_table
+            index = table[index]
         try:
-            while True:
-                x = self.source[self.current_index]
-                self.current_index += 1
-                if x not in self.skip or (not skip):
-                    return x
+            x = self.source[index]
         except IndexError:
-            return "[EOF]"
+            self.current_index = index
+            # Finding the end depends on there being no more input
+            self.reach = len(self.source) + 1
+            return self.EOF
+        self.current_index = index + 1
+        return x
+
+    def next_index(self) -> int:
+        """The index of the next character that is not skipped, or the length of the source at the end of the input."""
+        while True:
+            index = self.current_index
+            if self._skip_pattern is not None:
+                table = self._skip_table
+                if table is None or self._skipped_source is not self.source:
+                    table = self.skip_table
+                index = table[index]
+            if index < len(self.source):
+                if index >= self.reach:
+                    self.reach = index + 1
+                return index
+            if not self.fill():
+                self.reach = index + 1
+                return index
+
+    def lookahead(self) -> str:
+        """
+        The next character that is not skipped, without moving the buffer.
+
+        Returns:
+            The character, or an empty string at the end of the input.
+        """
+        index = self.next_index()
+        return self.source[index:index + 1]
+
+    def span(self, start: int) -> Span:
+        """A :class:`Span` of the source from `start` to the current index, without copying it."""
+        return Span(self.source, self.offset + start, self.offset + self.current_index, self.offset)
 
     def fetch(self, count: int = 1, skip: Union[str, bool] = True) -> str:
         """
@@ -89,28 +341,42 @@ class Buffer:
             count -= 1
             skip = False
 
+        if not skip or self._skip_pattern is None:
+            # Nothing is skipped, so the rest is one slice
+            while self.current_index + count > len(self.source) and self.fill():
+                pass
+            chunk = self.source[self.current_index:self.current_index + count]
+            self.current_index += len(chunk)
+            if len(chunk) < count:
+                self.reach = len(self.source) + 1
+                chunk += "[EOF]" * (count - len(chunk))
+            return retval + chunk
         for i in range(count):
             retval += self.fetch_char(skip)
         return retval
 
     def peek(self, count: int = 1, skip: bool = True) -> str:
-        self.mark()
+        """Like :meth:`fetch`, but leaves the buffer where it was."""
+        index = self.current_index
         try:
             return self.fetch(count, skip)
         finally:
-            self.abandon()
+            if self.current_index > self.reach:
+                self.reach = self.current_index
+            self.current_index = index
 
     def mark(self):
         """
         Adds the current location to the stack.
         """
         self.stack.append(self.current_index)
-        print(len(self.stack))
 
     def abandon(self):
         """
         Reverts to last recorded position on the stack
         """
+        if self.current_index > self.reach:
+            self.reach = self.current_index
         self.current_index = self.stack.pop()
 
     def commit(self):
@@ -119,6 +385,18 @@ class Buffer:
         """
         self.stack.pop()
 
+    def expected_at(self, index: int, terminal: Terminal):
+        """
+        Records that a terminal did not match at an index of the source, unless one has failed farther on.
+        This is cheap, and nothing is described until the parse fails, see :class:`~laggard.exceptions.ExpectationException`.
+        """
+        index += self.offset
+        if index > self.failure_index:
+            self.failure_index = index
+            self.expected = {terminal}
+        elif index == self.failure_index:
+            self.expected.add(terminal)
+
     def cry(self, message: str):
         """Raises a parse error with the location detailed.
 
@@ -137,5 +415,240 @@ class Buffer:
             self.commit()
 
     def is_eof(self):
-        print(self.current_index)
         return self.current_index + 1 >= len(self.source)
+
+
+class BytesBuffer(Buffer):
+    """
+    A buffer over binary input, which is never decoded: bytes, a bytearray, or a memoryview of either.
+    Characters are bytes, as integers: :meth:`fetch_char` returns one, or :attr:`EOF`, and :attr:`skip` is a set of them.
+    :attr:`source` is a memoryview of the input, so its slices are not copies.
+
+    Examples:
+        To skip spaces and tabs in a text-based protocol::
+
+            buf = BytesBuffer(data, skip=b" \\t")
+    """
+
+    EOF = -1
+    _NEWLINE = re.compile(b"\n")
+
+    def __init__(self, source: Union[bytes, bytearray, memoryview], skip: Iterable[int] = b""):
+        """
+        Args:
+            source: The binary input.
+            skip: The bytes which the buffer will skip.
+        """
+        view = memoryview(source)
+        if view.format != "B" or view.ndim != 1:
+            view = view.cast("B")
+        super().__init__(view, skip)
+
+    @staticmethod
+    def _run_of(chars: FrozenSet[int]) -> Optional[Pattern]:
+        escaped = b"".join(re.escape(bytes([c])) for c in sorted(chars))
+        return re.compile(b"[" + escaped + b"]+") if escaped else None
+
+    def lookahead(self) -> int:
+        """The next byte that is not skipped, without moving the buffer, or :attr:`EOF` at the end of the input."""
+        index = self.next_index()
+        return self.source[index] if index < len(self.source) else self.EOF
+
+    def span(self, start: int) -> memoryview:
+        """The source from `start` to the current index, which is a memoryview of the input, not a copy."""
+        return self.source[start:self.current_index]
+
+    def fetch(self, count: int = 1, skip: Union[str, bool] = True) -> bytes:
+        """Like :meth:`Buffer.fetch`, but returns bytes, without any past the end of the input."""
+        if skip == "initial":
+            first = self.fetch_char(True)
+            if first == self.EOF:
+                return b""
+            return bytes([first]) + self.fetch(count - 1, False)
+        if not skip or self._skip_pattern is None:
+            chunk = bytes(self.source[self.current_index:self.current_index + count])
+            self.current_index += len(chunk)
+            if len(chunk) < count:
+                self.reach = len(self.source) + 1
+            return chunk
+        result = bytearray()
+        for _ in range(count):
+            c = self.fetch_char(skip)
+            if c == self.EOF:
+                break
+            result.append(c)
+        return bytes(result)
+
+
+class _MappedReader:
+    """Reads decoded text from a memory-mapped file, a chunk at a time."""
+
+    def __init__(self, path: str, encoding: str):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.position = 0
+
+    def read(self, size: int) -> str:
+        text = ""
+        # A chunk may end part way through a character, in which case nothing is decoded yet
+        while not text and self.position < len(self.map):
+            data = self.map[self.position:self.position + size]
+            self.position += len(data)
+            text = self.decoder.decode(data, final=self.position >= len(self.map))
+        return text
+
+    def close(self):
+        self.map.close()
+
+
+class StreamBuffer(Buffer):
+    """
+    A :class:`Buffer` which reads its input from a file as it is needed, for inputs too large to hold in memory.
+
+    Only a window of the input is kept in :attr:`source`, starting from the oldest mark on the stack.
+    Whenever the stack empties, the input before the current position is released.
+    Indices on the stack, and :attr:`current_index`, are relative to the window; :attr:`offset` is where it begins.
+
+    Examples:
+        To parse a large file with a generated parser::
+
+            class FileParser(MyParser):
+                def _get_buffer(self, source):
+                    return StreamBuffer.open(source)
+
+            FileParser("dump.log").parse()
+    """
+
+    def __init__(self, stream: TextIO, skip: List = [], chunk_size: int = 1 << 20):
+        """
+        Args:
+            stream: A text file object, or anything else with a `read(size)` method returning strings.
+            skip: A list of the characters which the buffer will skip; they will not appear in the results of :meth:`fetch`.
+            chunk_size: How many characters to read at a time; also the least that is released at once.
+        """
+        super().__init__("", skip)
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.exhausted = False
+        self.fill()
+
+    @classmethod
+    def open(cls, path: str, encoding: str = "utf-8", use_mmap: bool = True, **kwargs) -> "StreamBuffer":
+        """
+        Creates a buffer reading the file at `path`, memory-mapped unless `use_mmap` is False.
+        Remaining arguments are passed on to the constructor.
+        """
+        reader = None
+        if use_mmap:
+            try:
+                reader = _MappedReader(path, encoding)
+            except ValueError:
+                # Empty files cannot be mapped
+                pass
+        if reader is None:
+            reader = io.open(path, encoding=encoding)
+        try:
+            return cls(reader, **kwargs)
+        except BaseException:
+            reader.close()
+            raise
+
+    def fill(self) -> bool:
+        if self.exhausted:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.close()
+            return False
+        self._append(chunk)
+        return True
+
+    def close(self):
+        """Closes the stream, after which the input ends where it has been read to."""
+        self.exhausted = True
+        self.stream.close()
+
+    def _release(self):
+        """Drops the consumed part of the window, if there is enough of it."""
+        if self.current_index < self.chunk_size:
+            return
+        consumed = self.source[:self.current_index]
+        newlines = consumed.count("\n")
+        if newlines:
+            self._lines_before += newlines
+            self._columns_before = len(consumed) - consumed.rfind("\n") - 1
+        else:
+            self._columns_before += len(consumed)
+        self.source = self.source[self.current_index:]
+        self.offset += self.current_index
+        self.reach -= self.current_index
+        self.current_index = 0
+
+    def get_index_from_position(self, position: TextPosition) -> int:
+        """
+        Finds the index in :attr:`source` of a line and column of the whole input.
+        Raises IndexError if the position has been released.
+        """
+        line_number, column_number = position
+        line_number -= self._lines_before
+        if line_number == 1:
+            column_number -= self._columns_before
+        if line_number < 1 or column_number < 1:
+            raise IndexError("Position {} is no longer in the buffer".format(tuple(position)))
+        while line_number >= len(self.line_starts) and self.fill():
+            pass
+        return super().get_index_from_position(position)
+
+    def fetch_char(self, skip=True) -> str:
+        while self.current_index >= len(self.source) and self.fill():
+            pass
+        x = super().fetch_char(skip)
+        if x == "[EOF]" and self.fill():
+            # The skipped characters ran to the end of the window
+            return self.fetch_char(skip)
+        return x
+
+    def abandon(self):
+        super().abandon()
+        if not self.stack:
+            self._release()
+
+    def commit(self):
+        super().commit()
+        if not self.stack:
+            self._release()
+
+    def is_eof(self):
+        while self.current_index + 1 >= len(self.source) and self.fill():
+            pass
+        return super().is_eof()
+
+
+class PushBuffer(StreamBuffer):
+    """
+    A :class:`StreamBuffer` whose input is given to it with :meth:`feed` as it arrives, rather than read from a file.
+    Until :meth:`close` is called, the end of :attr:`source` is only the end of the input received so far;
+    :attr:`reach` shows whether a parse depended on it.
+    """
+
+    def __init__(self, skip: List = [], chunk_size: int = 1 << 16):
+        """
+        Args:
+            skip: A list of the characters which the buffer will skip; they will not appear in the results of :meth:`fetch`.
+            chunk_size: The least that is released at once.
+        """
+        super().__init__(None, skip, chunk_size)
+
+    def fill(self) -> bool:
+        return False
+
+    def feed(self, text: str):
+        """Adds text to the end of the input."""
+        if self.exhausted:
+            raise ValueError("Cannot feed a closed buffer")
+        self._append(text)
+
+    def close(self):
+        """Marks the end of the input."""
+        self.exhausted = True
@@ -1,36 +1,163 @@
 import textwrap
-from typing import List
+from typing import Dict, FrozenSet, Iterable, List
 
 from laggard.grammar_asts import Grammar, Combined, Choice, ModifiedRuleExpression, LabelledRuleExpression, Identifier, \
-    Literal
-
-OPTIONAL_TEMPLATE = """try:
-    return {}
-except ParseException:
-    return None"""
-
-MULTIPLE_TEMPLATE = """try:
-    x = []
-    while True:
-        x.append({})
-except ParseException:
-    return x"""
-
-MANY_TEMPLATE = """try:
-    x = []
-    while True:
-        x.append({})
-except ParseException:
-    if not len(x):
-        raise
-    return x"""
+    Literal, Cut, CharacterClass
+from laggard.analysis import GrammarAnalysis, TEXT, DISCARD, has_cut
+from laggard.memo import MEMO_POLICIES
+from laggard.optimizer import GrammarOptimizer
+
+#: The deepest nesting of loop, try and with statements allowed in a generated function; Python permits 20
+MAX_BLOCK_DEPTH = 16
+
+
+def _indent(lines: List[str], levels: int = 1) -> List[str]:
+    return [" " * 4 * levels + line for line in lines]
+
+
+def _height(node) -> int:
+    """The depth of the expression tree, which is the call depth of a rule when every subexpression is a function."""
+    if isinstance(node, (Combined, Choice)):
+        return 1 + max(_height(child) for child in node.children)
+    elif isinstance(node, (ModifiedRuleExpression, LabelledRuleExpression)):
+        return 1 + _height(node.expr)
+    return 1
+
+
+def _label(node: LabelledRuleExpression) -> str:
+    return node.label.name if isinstance(node.label, Identifier) else node.label
+
+
+class _Scope:
+    """
+    A choice alternative, optional or repetition item, which a cut commits.
+    Scopes which hold no mark on the buffer, like the last alternative of a choice, have nothing to commit.
+    """
+
+    def __init__(self, flag: str = None):
+        #: The variable recording whether the cut has happened, if the scope has a mark and contains a cut.
+        self.flag = flag
+        self.cut = False
+
+
+class _Function:
+    """The state of a generated function, while its body is emitted."""
+
+    def __init__(self, build: bool = True):
+        #: Whether the function builds the results of its expressions; if not, it only matches them.
+        self.build = build
+        self.variables = 0
+        self.blocks = 0
+        self.scopes = [_Scope()]
+        #: How many generated functions deep a call to this function goes, counting itself.
+        self.call_depth = 1
+
+    def variable(self) -> str:
+        self.variables += 1
+        return "x{}".format(self.variables - 1)
+
+    def enter(self, node, marked: bool = True) -> _Scope:
+        """Starts a scope holding the node, with a cut flag if it needs one."""
+        scope = _Scope(self.variable() if marked and has_cut(node) else None)
+        self.scopes.append(scope)
+        return scope
+
+    def exit(self):
+        self.scopes.pop()
+
+
+FAILURE_MODES = ("sentinel", "exception")
+
+#: The fewest alternatives of a choice of literals for which it is matched with a :class:`~laggard.helpers.LiteralTable`,
+#: rather than by comparing the lookahead character with each alternative's.
+LITERAL_TABLE_SIZE = 4
+
 
 class CodeGenerator:
-    def __init__(self, root: Grammar):
+    def __init__(self, root: Grammar, packrat: bool = False, memo_policy: str = "unbounded", memo_size: int = None,
+                 failure_mode: str = "sentinel", inline_threshold: int = 32, predictive: bool = True,
+                 profile: bool = False, text_transformers: Iterable[str] = (), spans: bool = False,
+                 binary: bool = False, optimize: Iterable[str] = ()):
+        """
+        Args:
+            root: The grammar to generate a parser for.
+            packrat: Whether every rule and fragment should be memoised, see :func:`~laggard.memo.memoize`.
+                This makes parse time linear in the input length, at the cost of memory. Repetitions of items
+                which are not literals or classes are matched in memoized runs too, see :func:`~laggard.memo.repeat`.
+            memo_policy: How the memo table is bounded, one of :data:`~laggard.memo.MEMO_POLICIES`.
+            memo_size: The size parameter of the memo policy.
+            failure_mode: How the generated rules signal that they did not match.
+                With "sentinel", they return :data:`~laggard.helpers.FAIL`, and only :meth:`Parser.parse() <laggard.abstracts.Parser.parse>` raises.
+                With "exception", they raise :class:`~laggard.exceptions.ParseException`, as handwritten rules do.
+            inline_threshold: The largest subexpression, in grammar nodes, which is emitted inline in its rule's function.
+                Larger ones get a `parse_<rule>_fragmentN` function of their own; 0 gives every subexpression one.
+                Fragments are also made where inlining would nest statements too deeply for Python.
+            predictive: Whether a choice should check the next character against each alternative's FIRST set
+                (see :class:`~laggard.analysis.GrammarAnalysis`), and only try those which can match.
+            profile: Whether each rule should record its calls, results and timings in the parser's
+                :class:`~laggard.profiling.Profile`. Without it, the generated code has no instrumentation at all.
+            text_transformers: Transformers which are given the text a rule matched, rather than its result.
+            spans: Whether the text a rule matched is given as a :class:`~laggard.buffer.Span` of the source,
+                which is only copied into a string when it is converted, rather than as a string.
+            binary: Whether the parser reads bytes rather than text, as a :class:`~laggard.abstracts.BinaryParser`.
+                Every character of the grammar's literals and classes, which may be escaped like `"\\r\\n"` and
+                `"\\x00"`, stands for the byte of the same value, so must be below 256.
+            optimize: The passes of :class:`~laggard.optimizer.GrammarOptimizer` to run over the grammar first,
+                such as :data:`~laggard.optimizer.PASSES`. The optimizer is kept as `optimizer`, which reports
+                how many nodes each pass removed.
+
+        A rule written `name:transformer = ...;` returns `self.transformer(result)`, a method the parser class must be
+        given, once it matches. Rules with the transformer `text` return the text they matched, and `discard` None;
+        neither, nor rules with one of `text_transformers`, build the lists and tuples of their usual result.
+        Sequences containing labelled parts, like `key:name "=" value:name`, give
+        an :class:`~laggard.helpers.OptionallyNamedTuple`, which can be indexed by the labels.
+
+        Character classes, like `[a-z_]`, test the next character against a frozenset in the parser class,
+        and a class repeated with `*` or `+` matches its whole run with one regular expression.
+        A choice of :data:`LITERAL_TABLE_SIZE` or more literals, like keywords, looks up the literals which begin with
+        the next character in a :class:`~laggard.helpers.LiteralTable`, and only compares those.
+        """
+        if memo_policy not in MEMO_POLICIES:
+            raise ValueError("Unknown memo policy '{}'".format(memo_policy))
+        if failure_mode not in FAILURE_MODES:
+            raise ValueError("Unknown failure mode '{}'".format(failure_mode))
+        self.binary = binary
+        self.optimizer = None
+        if optimize:
+            self.optimizer = GrammarOptimizer(optimize, text_transformers)
+            root = self.optimizer.optimize(root)
         self.root = root
+        self.packrat = packrat
+        self.memo_policy = memo_policy
+        self.memo_size = memo_size
+        self.sentinel = failure_mode == "sentinel"
+        self.inline_threshold = inline_threshold
+        self.analysis = GrammarAnalysis(root) if predictive else None
+        self.profile = profile
+        self.text_transformers = {TEXT} | set(text_transformers)
+        self.spans = spans
+        self._labelled = False
+        # Whether a result may hold offsets into the input: spans, or whatever a transformer builds from a result
+        transformers = {rule.transformer.name if isinstance(rule.transformer, Identifier) else rule.transformer
+                        for rule in root.children}
+        self._offsets = spans or any(transformer not in self.text_transformers | {DISCARD, None}
+                                     for transformer in transformers)
+        #: The name of the parser class attribute holding each character class's characters
+        self.charsets: Dict[FrozenSet[str], str] = {}
+        #: The name of the parser class attribute holding each choice of literals' table
+        self.literal_tables: Dict[tuple, str] = {}
+        #: The name of the parser class attribute holding the code of each tuple of terminals a lookahead can rule out
+        self.leading_terminals: Dict[str, str] = {}
+        #: How many repetitions are matched in memoized runs, see :func:`~laggard.memo.repeat`
+        self.repetition_sites = 0
         self.code: str = ""
         self.functions = []
         self.fragment_counts = {}
+        #: Each generated function's call depth, see :class:`_Function`
+        self.call_depths = {}
+        #: For each rule, its call depth with every subexpression as a function, and as generated.
+        self.rule_call_depths = {}
+        self._sizes = {}
         self.context: List[str] = []
 
     def generate(self):
@@ -39,80 +166,492 @@ class CodeGenerator:
                 n = rule.name.name
             else:
                 n = rule.name
-            self.generate_rule(rule.children[0], n, inline=False)
+            transformer = rule.transformer.name if isinstance(rule.transformer, Identifier) else rule.transformer
+            self.generate_rule(rule.content, n, inline=False, transformer=transformer)
+            self.rule_call_depths[n] = (_height(rule.content), self.call_depths["parse_" + n])
 
-        content = "\n".join(["from laggard.abstracts import Parser", "from laggard.exceptions import ParseException", "class MyParser(Parser):\n"])
+        base = "BinaryParser" if self.binary else "Parser"
+        header = ["from laggard.abstracts import " + base, "from laggard.exceptions import ParseException",
+                  "from laggard.helpers import FAIL"]
+        if self.packrat:
+            header.append("from laggard.memo import memoize, repeat" if self.repetition_sites else
+                          "from laggard.memo import memoize")
+        if self._labelled:
+            header.append("from laggard.helpers import OptionallyNamedTuple")
+        if self.literal_tables:
+            header.append("from laggard.helpers import LiteralTable")
+        if self.profile:
+            header.append("from laggard.profiling import profiled")
+        header.append("class MyParser({}):\n".format(base))
+        content = "\n".join(header)
+        if self.packrat:
+            content += "    memo_policy = {!r}\n    memo_size = {!r}\n".format(self.memo_policy, self.memo_size)
+        if self.profile:
+            content += "    profiling = True\n"
+        if not self._offsets:
+            content += "    results_hold_offsets = False\n"
+        for chars, name in self.charsets.items():
+            if self.binary:
+                chars = bytes(sorted(map(ord, chars)))
+            else:
+                chars = "".join(sorted(chars))
+            content += "    {} = frozenset({!r})\n".format(name, chars)
+        for literals, name in self.literal_tables.items():
+            content += "    {} = LiteralTable(({},))\n".format(name, ", ".join(map(self._literal, literals)))
+        for terminals, name in self.leading_terminals.items():
+            content += "    {} = {}\n".format(name, terminals)
         for f in self.functions:
             content += textwrap.indent(f, " "*4) + "\n"
         return content
 
 
-    def generate_rule(self, children, name, inline=True):
+    def call_depth_report(self) -> str:
+        """
+        Describes how inlining changed each rule's call depth: the most generated functions on the stack
+        before it reaches a literal or another rule. Only meaningful after :meth:`generate`.
+        """
+        lines = []
+        for rule, (before, after) in self.rule_call_depths.items():
+            lines.append("{}: {} -> {}".format(rule, before, after))
+        return "\n".join(lines)
+
+    def generate_rule(self, children, name, inline=True, transformer: str = None, build: bool = True):
         if not inline:
             # Reset the name context
             self.context.clear()
 
-        content = ""
-        if isinstance(children, Combined):
-            if len(children.children) > 1:
-                content = "return [\n"
-            else:
-                content = "return "
-            for i, child in enumerate(children.children):
-                content += self.generate_rule(child, name)
-                if len(children.children) > 1:
-                    content += ","
-                content += "\n"
-            if len(children.children) > 1:
-                content += "]"
-
-        elif isinstance(children, Choice):
-            for i, child in enumerate(children.children):
-                content = "try:"
-                content += "\n" + textwrap.indent("return " + self.generate_rule(child, name), " "*4)
-                if i+1 < len(children.children):
-                    content += "\nexcept ParseException: pass"
-
-        elif isinstance(children, ModifiedRuleExpression):
-            template = OPTIONAL_TEMPLATE if children.modifier == "?" else (MANY_TEMPLATE if children.modifier == "+" else MULTIPLE_TEMPLATE)
-            content = template.format(self.generate_rule(children.expr, name))
-        elif isinstance(children, LabelledRuleExpression):
-            content = "return {} # Label: {}".format(self.generate_rule(children.expr,name), children.label)
-        elif isinstance(children, Identifier):
-            content = "return self.parse_{}()".format(children.name)
-        elif isinstance(children, Literal):
-            content = "return self.expect(\"{}\")".format(children.value)
+        text = transformer in self.text_transformers
+        function = _Function(build and not text and transformer != DISCARD)
+        call = self._call(children)
+        if call is not None and function.build and transformer is None:
+            content = "return " + call
+        elif text:
+            content = "\n".join(self.emit_text(children, name, function, transformer))
+        else:
+            lines, value = self.emit_root(children, name, function, ["return FAIL"])
+            if transformer == DISCARD:
+                value = "None"
+            elif transformer is not None:
+                value = "self.{}({})".format(transformer, value)
+            content = "\n".join(lines + ["return " + value])
 
         if inline:
-            # Always produces a fragment function
-            # TODO: Make 100000% more efficient with 1x10^02394823049832 thinks
-            name = self.add_fragment(name, content)
+            name = self.add_fragment(name, content, function.call_depth)
         else:
-            name = self.add_rule(name, content)
+            name = self.add_rule(name, content, function.call_depth)
 
         # Returns the code to call the gen function
         return name
 
+    def _call(self, node, build: bool = True):
+        """
+        The code which matches a leaf of the grammar, or None if the node is not a leaf.
+        A character class repeated with `*` or `+` is a leaf too, which is matched as one run,
+        and so is a choice of enough literals, which is matched with a table of them.
+        """
+        if isinstance(node, Identifier):
+            return "self.parse_{}()".format(node.name)
+        elif isinstance(node, Literal):
+            return "self.{}({})".format("match" if self.sentinel else "expect", self._literal(node.value))
+        elif isinstance(node, CharacterClass):
+            args = self._charset(node.chars) + (", True" if node.negated else "")
+            return "self.{}({})".format("match_class" if self.sentinel else "expect_class", args)
+        elif isinstance(node, Choice) and len(node.children) >= LITERAL_TABLE_SIZE and \
+                all(isinstance(child, Literal) and child.value for child in node.children):
+            literals = tuple(child.value for child in node.children)
+            if literals not in self.literal_tables:
+                self.literal_tables[literals] = "_literals{}".format(len(self.literal_tables))
+            return "self.{}(self.{})".format("match_literals" if self.sentinel else "expect_literals",
+                                             self.literal_tables[literals])
+        elif isinstance(node, ModifiedRuleExpression) and node.modifier != "?" and isinstance(node.expr, CharacterClass):
+            args = "{}, {}, {}".format(self._charset(node.expr.chars), node.expr.negated, node.modifier == "+")
+            if not build:
+                args += ", build=False"
+            return "self.{}({})".format("match_run" if self.sentinel else "expect_run", args)
+        return None
+
+    def _literal(self, value: str) -> str:
+        """The code for a literal of the grammar, as the parser compares it with the input."""
+        if not self.binary:
+            return repr(value)
+        try:
+            return repr(value.encode("latin-1"))
+        except UnicodeEncodeError:
+            raise ValueError("The binary grammar has a character above \\xff in {!r}".format(value)) from None
+
+    def _char(self, c: str) -> str:
+        """The code for a character, as the parser compares it with the lookahead: for binary input, its byte value."""
+        return repr(ord(c)) if self.binary else repr(c)
+
+    def _charset(self, chars: FrozenSet[str], owner: str = "self.") -> str:
+        """The parser class attribute holding a set of characters, like those of a class, shared by equal sets."""
+        try:
+            return owner + self.charsets[chars]
+        except KeyError:
+            if self.binary:
+                # Checks each character is a byte
+                self._literal("".join(chars))
+            self.charsets[chars] = "_charset{}".format(len(self.charsets))
+            return owner + self.charsets[chars]
+
+    def _size(self, node) -> int:
+        try:
+            return self._sizes[id(node)]
+        except KeyError:
+            pass
+        if isinstance(node, (Combined, Choice)):
+            size = 1 + sum(self._size(child) for child in node.children)
+        elif isinstance(node, (ModifiedRuleExpression, LabelledRuleExpression)):
+            size = 1 + self._size(node.expr)
+        else:
+            size = 1
+        self._sizes[id(node)] = size
+        return size
+
+    def _blocks(self, node) -> int:
+        """How many nested blocks the code for the node opens, around its subexpressions."""
+        if isinstance(node, Choice):
+            return 1 if self.sentinel else 2
+        elif isinstance(node, ModifiedRuleExpression):
+            return 1 if self.sentinel or node.modifier == "?" else 3
+        elif isinstance(node, (Combined, LabelledRuleExpression)):
+            return 0
+        return 0
+
+    def emit_root(self, node, name: str, function: _Function, fail: List[str]):
+        """Like :meth:`emit_inline`, for the whole body of a function, which may be a leaf."""
+        call = self._call(node, function.build)
+        if call is not None:
+            return self._check(function, call, fail)
+        return self.emit_inline(node, name, function, fail)
+
+    def emit_text(self, node, name: str, function: _Function, transformer: str) -> List[str]:
+        """The body of a rule which returns (a transformation of) the text it matched, holding a mark over it."""
+        start = function.variable()
+        span = function.variable()
+        if self.spans:
+            text = "{} = self.buffer.span({})".format(span, start)
+        else:
+            text = "{} = self.buffer.source[{}:self.buffer.current_index]".format(span, start)
+        if self.sentinel:
+            lines, _ = self.emit_root(node, name, function, ["self.buffer.abandon()", "return FAIL"])
+            lines = ["self.buffer.mark()", "{} = self.buffer.current_index".format(start)] + lines
+            lines += [text, "self.buffer.commit()"]
+        else:
+            function.blocks += 1
+            lines, _ = self.emit_root(node, name, function, [])
+            function.blocks -= 1
+            lines = ["{} = self.buffer.current_index".format(start)] + lines + [text]
+            lines = ["with self.buffer:"] + _indent(lines)
+        if transformer == TEXT:
+            return lines + ["return " + span]
+        return lines + ["return self.{}({})".format(transformer, span)]
+
+    def _check(self, function: _Function, call: str, fail: List[str]):
+        """
+        Assigns the result of a call to a new variable, followed by the failure check in sentinel mode.
+        In exception mode, the call is a statement of its own if its result is not built.
+        """
+        if not self.sentinel:
+            if not function.build:
+                return [call], "None"
+            return [], call
+        v = function.variable()
+        return ["{} = {}".format(v, call), "if {} is FAIL:".format(v)] + _indent(fail), v
+
+    def emit(self, node, name: str, function: _Function, fail: List[str]):
+        """
+        Generates the statements which match a grammar expression within a function.
+
+        Args:
+            node: The grammar expression.
+            name: The rule it belongs to.
+            function: The function being generated.
+            fail: The statements run when it does not match, in sentinel mode.
+
+        Returns:
+            The lines of code, and an expression for the result, which is valid after they have run.
+        """
+        call = self._call(node, function.build)
+        # A cut must stay in the function of the scope it commits
+        if call is None and not has_cut(node) and (self._size(node) > self.inline_threshold
+                                                    or function.blocks + self._blocks(node) > MAX_BLOCK_DEPTH):
+            call = self.generate_rule(node, name, build=function.build)
+            function.call_depth = max(function.call_depth, 1 + self.call_depths[call[5:-2]])
+        if call is not None:
+            return self._check(function, call, fail)
+        return self.emit_inline(node, name, function, fail)
+
+    def emit_inline(self, node, name: str, function: _Function, fail: List[str]):
+        """Like :meth:`emit`, but never moves the node itself into a fragment."""
+        if isinstance(node, Combined):
+            return self.emit_combined(node, name, function, fail)
+        elif isinstance(node, Choice):
+            return self.emit_choice(node, name, function, fail)
+        elif isinstance(node, ModifiedRuleExpression):
+            if node.modifier == "?":
+                return self.emit_optional(node, name, function, fail)
+            return self.emit_repetition(node, name, function, fail)
+        elif isinstance(node, LabelledRuleExpression):
+            lines, value = self.emit(node.expr, name, function, fail)
+            return ["# Label: {}".format(_label(node))] + lines, value
+        elif isinstance(node, Cut):
+            return self.emit_cut(function), "None"
+        raise ValueError("Cannot generate code for {!r}".format(node))
+
+    def emit_cut(self, function: _Function) -> List[str]:
+        scope = function.scopes[-1]
+        if scope.flag is None or scope.cut:
+            # Nothing (more) to commit
+            return []
+        scope.cut = True
+        return ["self.cut()", "{} = True".format(scope.flag)]
+
+    def emit_combined(self, node: Combined, name: str, function: _Function, fail: List[str]):
+        parts = [self.emit(child, name, function, fail) for child in node.children]
+        # Cuts are left out of the result
+        results = [i for i, child in enumerate(node.children) if not isinstance(child, Cut)]
+        if len(parts) == 1:
+            return parts[0]
+        if not function.build:
+            return [line for child_lines, _ in parts for line in child_lines], "None"
+        lines = []
+        values = []
+        for i, (child_lines, value) in enumerate(parts):
+            lines += child_lines
+            if i not in results:
+                continue
+            # A call must happen before the statements of the later parts
+            if not value.isidentifier() and any(later_lines for later_lines, _ in parts[i + 1:]):
+                v = function.variable()
+                lines.append("{} = {}".format(v, value))
+                value = v
+            values.append(value)
+        if len(values) == 1 and len(results) < len(parts):
+            return lines, values[0]
+        labels = [_label(node.children[i]) if isinstance(node.children[i], LabelledRuleExpression) else None
+                  for i in results]
+        if any(labels):
+            self._labelled = True
+            return lines, "OptionallyNamedTuple({!r}, [{}])".format(labels, ", ".join(values))
+        return lines, "[{}]".format(", ".join(values))
+
+    def _viable(self, node, lookahead: str, negate: bool = False):
+        """A condition on the lookahead character under which the node may match (or may not), or None if it always may."""
+        if self.analysis is None or not self.analysis.is_predictable(node):
+            return None
+        first = sorted(self.analysis.first_of(node))
+        if len(first) == 1:
+            return "{} {} {}".format(lookahead, "!=" if negate else "==", self._char(first[0]))
+        return "{} {} {{{}}}".format(lookahead, "not in" if negate else "in", ", ".join(map(self._char, first)))
+
+    def _leading_terminals(self, node, owner: str = "self.", rules: FrozenSet[str] = frozenset()) -> List[str]:
+        """
+        The code for the terminals which trying a predictable expression would test first, as trying it would
+        record them if the next character is none they can begin with: its leading literals and character classes,
+        through rules, choices and nullable parts, or where those are unknown, the class of the characters it can
+        begin with.
+        """
+        if isinstance(node, Literal):
+            return [self._literal(node.value)] if node.value else []
+        elif isinstance(node, CharacterClass) and not node.negated:
+            return ["({}, False)".format(self._charset(node.chars, owner))]
+        elif isinstance(node, Identifier) and node.name in self.analysis.rules and node.name not in rules:
+            return self._leading_terminals(self.analysis.rules[node.name], owner, rules | {node.name})
+        elif isinstance(node, (Combined, Choice)):
+            terminals = []
+            for child in node.children:
+                terminals += [t for t in self._leading_terminals(child, owner, rules) if t not in terminals]
+                if isinstance(node, Combined) and not self.analysis.is_nullable(child):
+                    break
+            return terminals
+        elif isinstance(node, (ModifiedRuleExpression, LabelledRuleExpression)):
+            return self._leading_terminals(node.expr, owner, rules)
+        elif isinstance(node, Cut):
+            return []
+        return ["({}, False)".format(self._charset(self.analysis.first_of(node), owner))]
+
+    def emit_choice(self, node: Choice, name: str, function: _Function, fail: List[str]):
+        # Every alternative but the last reverts the buffer if it fails; the last lets the failure propagate
+        t = function.variable()
+        lines = ["{} = FAIL".format(t)]
+        lookahead = function.variable()
+        conditions = [self._viable(child, lookahead) for child in node.children]
+        if any(conditions):
+            start = function.variable()
+            lines.append("{} = self.buffer.next_index()".format(start))
+            if self.binary:
+                lines.append("{} = self.buffer.source[{}] if {} < len(self.buffer.source) else -1".format(
+                    lookahead, start, start))
+            else:
+                lines.append("{} = self.buffer.source[{}:{} + 1]".format(lookahead, start, start))
+            # The alternatives the lookahead rules out are recorded as expected there, as trying them would have,
+            # whether or not the choice then matches; in exception mode, the last alternative is always tried
+            terminals = []
+            for i, child in enumerate(node.children):
+                if conditions[i] and (self.sentinel or i + 1 < len(node.children)):
+                    terminals += [t for t in self._leading_terminals(child, owner="") if t not in terminals]
+            if terminals:
+                terminals = "({},)".format(", ".join(terminals))
+                if terminals not in self.leading_terminals:
+                    self.leading_terminals[terminals] = "_leading{}".format(len(self.leading_terminals))
+                lines.append("self.expected_first({}, {}, self.{})".format(
+                    start, lookahead, self.leading_terminals[terminals]))
+        for i, child in enumerate(node.children):
+            last = i + 1 == len(node.children)
+            scope = function.enter(child, marked=not last)
+            if last and self.sentinel:
+                child_lines, value = self.emit(child, name, function, fail)
+                code = child_lines + ["{} = {}".format(t, value)]
+                if conditions[i]:
+                    code = ["if {}:".format(self._viable(child, lookahead, negate=True))] + _indent(fail) + code
+            elif last:
+                function.blocks += 1
+                child_lines, value = self.emit(child, name, function, fail)
+                function.blocks -= 1
+                code = child_lines + ["{} = {}".format(t, value)]
+            elif self.sentinel:
+                function.blocks += 1
+                child_lines, value = self.emit(child, name, function, ["break"])
+                function.blocks -= 1
+                code = self._sentinel_scope(scope, child_lines + ["{} = {}".format(t, value)], t, fail, [])
+            else:
+                function.blocks += 2
+                child_lines, value = self.emit(child, name, function, fail)
+                function.blocks -= 2
+                code = self._exception_scope(scope, child_lines + ["{} = {}".format(t, value)], [])
+            function.exit()
+            condition = conditions[i] if not last else None
+            if i:
+                condition = "{} is FAIL and {}".format(t, condition) if condition else "{} is FAIL".format(t)
+            lines += ["if {}:".format(condition)] + _indent(code) if condition else code
+        return lines, t
+
+    def _sentinel_scope(self, scope: _Scope, body: List[str], t: str, fail: List[str], otherwise: List[str]):
+        """
+        Wraps the body of a choice alternative or optional, in sentinel mode, so that the buffer reverts if it fails.
+        `t` holds the result, and remains FAIL if the body fails; `otherwise` then runs, unless a cut has happened.
+        """
+        lines = ["{} = False".format(scope.flag)] if scope.flag else []
+        lines += ["self.buffer.mark()", "while True:"] + _indent(body + ["break"])
+        if scope.flag is None:
+            return lines + ["if {} is FAIL:".format(t), "    self.buffer.abandon()"] + _indent(otherwise) + \
+                   ["else:", "    self.buffer.commit()"]
+        lines += ["if {} is FAIL:".format(t), "    if {}:".format(scope.flag)] + _indent(fail, 2)
+        return lines + ["    self.buffer.abandon()"] + _indent(otherwise) + \
+               ["elif not {}:".format(scope.flag), "    self.buffer.commit()"]
+
+    def _exception_scope(self, scope: _Scope, body: List[str], otherwise: List[str]):
+        """
+        Wraps the body of a choice alternative or optional, in exception mode, so that the buffer reverts if it fails.
+        `otherwise` runs if it does fail, unless a cut has happened, in which case the exception propagates.
+        """
+        if scope.flag is None:
+            return ["try:", "    with self.buffer:"] + _indent(body, 2) + \
+                   ["except ParseException:"] + _indent(otherwise or ["pass"])
+        lines = ["{} = False".format(scope.flag), "self.buffer.mark()", "try:"] + _indent(body)
+        lines += ["except ParseException:", "    if {}:".format(scope.flag), "        raise", "    self.buffer.abandon()"]
+        lines += _indent(otherwise)
+        return lines + ["else:", "    if not {}:".format(scope.flag), "        self.buffer.commit()"]
+
+    def emit_optional(self, node: ModifiedRuleExpression, name: str, function: _Function, fail: List[str]):
+        t = function.variable()
+        scope = function.enter(node.expr)
+        function.blocks += self._blocks(node)
+        if self.sentinel:
+            child_lines, value = self.emit(node.expr, name, function, ["break"])
+            lines = ["{} = FAIL".format(t)]
+            lines += self._sentinel_scope(scope, child_lines + ["{} = {}".format(t, value)], t, fail,
+                                          ["{} = None".format(t)])
+        else:
+            child_lines, value = self.emit(node.expr, name, function, [])
+            lines = self._exception_scope(scope, child_lines + ["{} = {}".format(t, value)], ["{} = None".format(t)])
+        function.blocks -= self._blocks(node)
+        function.exit()
+        return lines, t
+
+    def emit_repetition(self, node: ModifiedRuleExpression, name: str, function: _Function, fail: List[str]):
+        t = function.variable()
+        # In packrat mode, items which are not leaves are matched in memoized runs, unless a cut ends the repetition
+        if self.packrat and not has_cut(node.expr) and (isinstance(node.expr, Identifier)
+                                                         or self._call(node.expr) is None):
+            if isinstance(node.expr, Identifier):
+                item = "parse_" + node.expr.name
+            else:
+                item = self.generate_rule(node.expr, name, build=function.build)[5:-2]
+                function.call_depth = max(function.call_depth, 1 + self.call_depths[item])
+            site = "{}*{}".format(name, self.repetition_sites)
+            self.repetition_sites += 1
+            lines = ["{} = repeat(self, {!r}, {!r}, {}, {})".format(t, item, site, function.build,
+                                                                      node.modifier == "+")]
+            if self.sentinel and node.modifier == "+":
+                lines += ["if {} is FAIL:".format(t)] + _indent(fail)
+            return lines, t
+        scope = function.enter(node.expr)
+        flag = scope.flag
+        function.blocks += self._blocks(node)
+        # Without building the list, t only records whether an item matched
+        empty = "[]" if function.build else "False"
+        if self.sentinel:
+            if flag is None:
+                child_lines, value = self.emit(node.expr, name, function, ["self.buffer.abandon()", "break"])
+                body = ["self.buffer.mark()"] + child_lines + ["self.buffer.commit()"]
+            else:
+                # After a cut, a failed item fails the whole repetition
+                item_fail = ["if {}:".format(flag), "    {} = FAIL".format(t), "else:", "    self.buffer.abandon()", "break"]
+                child_lines, value = self.emit(node.expr, name, function, item_fail)
+                body = ["{} = False".format(flag), "self.buffer.mark()"] + child_lines
+                body += ["if not {}:".format(flag), "    self.buffer.commit()"]
+            lines = ["{} = {}".format(t, empty), "while True:"] + _indent(body + [self._append(function, t, value)])
+            if flag is not None:
+                lines += ["if {} is FAIL:".format(t)] + _indent(fail)
+            if node.modifier == "+":
+                lines += ["if not {}:".format(t)] + _indent(fail)
+        else:
+            child_lines, value = self.emit(node.expr, name, function, [])
+            if flag is None:
+                lines = ["{} = {}".format(t, empty), "try:", "    while True:", "        with self.buffer:"]
+                lines += _indent(child_lines + [self._append(function, t, value)], 3)
+                lines += ["except ParseException:"]
+                lines += ["    if not {}:".format(t), "        raise"] if node.modifier == "+" else ["    pass"]
+            else:
+                lines = ["{} = {}".format(t, empty), "while True:", "    {} = False".format(flag), "    self.buffer.mark()",
+                         "    try:"]
+                lines += _indent(child_lines + [self._append(function, t, value)], 2)
+                lines += ["    except ParseException:", "        if {}:".format(flag), "            raise",
+                          "        self.buffer.abandon()"]
+                lines += ["        if not {}:".format(t), "            raise"] if node.modifier == "+" else []
+                lines += ["        break", "    if not {}:".format(flag), "        self.buffer.commit()"]
+        function.blocks -= self._blocks(node)
+        function.exit()
+        return lines, t
+
+    @staticmethod
+    def _append(function: _Function, t: str, value: str) -> str:
+        return "{}.append({})".format(t, value) if function.build else "{} = True".format(t)
 
     def add_to_context(self, name=None):
         self.context.append(name)
 
-    def add_function(self, name, content):
-        s = "\ndef {}(self):".format(name)
+    def add_function(self, name, content, call_depth=1, rule=False):
+        s = "\n@profiled" if self.profile and rule else ""
+        s += "\n@memoize" if self.packrat else ""
+        s += "\ndef {}(self):".format(name)
         s += "\n" + textwrap.indent(content, " "*4)
         self.functions.append(s)
+        self.call_depths[name] = call_depth
         return f"self.{name}()"
 
-    def add_rule(self, rule_name, content):
-        return self.add_function(f"parse_{rule_name}", content)
+    def add_rule(self, rule_name, content, call_depth=1):
+        return self.add_function(f"parse_{rule_name}", content, call_depth, rule=True)
 
-    def add_fragment(self, rule_name, content):
+    def add_fragment(self, rule_name, content, call_depth=1):
         try:
             self.fragment_counts[rule_name] = self.fragment_counts[rule_name] + 1
         except KeyError:
             self.fragment_counts[rule_name] = 1
         name = "parse_{}_fragment{}".format(rule_name, self.fragment_counts[rule_name])
-        return self.add_function(name, content)
+        return self.add_function(name, content, call_depth)
 
 
 
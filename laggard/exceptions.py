@@ -1,4 +1,4 @@
-from typing import List
+from typing import FrozenSet, Iterable, List, Set, Tuple, Union
 
 from laggard.infoholders import ParseInfo
 
@@ -18,7 +18,124 @@ class MalformedParserException(Exception):
     """
     pass
 
+#: Something the input was expected to hold: a literal, or the characters and negation of a character class.
+#: A choice whose alternatives were ruled out by its lookahead character records them together, as the character
+#: and the terminal each of those alternatives begins with; see :func:`ruled_out`.
+#: For binary input, literals are bytes, and classes and lookahead characters hold byte values.
+Terminal = Union[str, bytes, Tuple[FrozenSet[Union[str, int]], bool], Tuple[Union[str, int], tuple]]
+
+
+def ruled_out(terminals: Iterable[Terminal]) -> Set[Terminal]:
+    """
+    The literals and classes among `terminals`, with those of each choice replaced by the ones its lookahead character
+    (which is empty, or for binary input -1, at the end of the input) ruled out.
+    """
+    result = set()
+    for terminal in terminals:
+        if isinstance(terminal, (str, bytes)) or not isinstance(terminal[1], tuple):
+            result.add(terminal)
+            continue
+        lookahead, alternatives = terminal
+        for alternative in alternatives:
+            if isinstance(alternative, (str, bytes)):
+                if alternative[0] != lookahead:
+                    result.add(alternative)
+            elif lookahead not in alternative[0]:
+                result.add(alternative)
+    return result
+
+
+def describe_terminal(terminal: Terminal) -> str:
+    """
+    Writes a terminal as in the grammar, with a class's consecutive characters as ranges, like `[0-9_]`,
+    and a class of one character as a literal. Bytes are written as in a bytes literal, like `[\\x00-\\x1f]`.
+    """
+    if isinstance(terminal, (str, bytes)):
+        return repr(terminal)
+    charset, negated = terminal
+    binary = any(isinstance(c, int) for c in charset)
+    if len(charset) == 1 and not negated:
+        c = next(iter(charset))
+        return repr(bytes([c])) if binary else repr(c)
+    if binary:
+        # The repr of a byte without its b'' quotes
+        write = lambda code: repr(bytes([code]))[2:-1]
+    else:
+        write = chr
+    ranges = []
+    for code in sorted(charset if binary else map(ord, charset)):
+        if ranges and ranges[-1][1] == code - 1:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    body = "".join(write(first) + write(last) if last - first == 1 else write(first) if first == last
+                   else "{}-{}".format(write(first), write(last)) for first, last in ranges)
+    return "[{}{}]".format("^" if negated else "", body)
+
+
 class ExpectationException(ParseException):
-    pass
+    """
+    Raised when the input does not hold any of the terminals expected at an index of it.
+    Raising it only stores the index; the message, with the text found there and its position,
+    is built when the exception is shown.
+    """
+
+    def __init__(self, buffer, index: int, expected: Iterable[Terminal], message: str = None):
+        """
+        Args:
+            buffer: The :class:`~laggard.buffer.Buffer` the input was read from.
+            index: The index in the whole input.
+            expected: The terminals which did not match there.
+            message: The message, if it has already been built.
+        """
+        super().__init__()
+        self.buffer = buffer
+        self.index = index
+        self.expected = expected
+        self._message = message
+
+    @property
+    def terminals(self) -> Set[Terminal]:
+        """The literals and character classes which were expected."""
+        return ruled_out(self.expected)
+
+    def __str__(self):
+        if self._message is None:
+            self._message = self._build_message()
+        return self._message
+
+    def _build_message(self) -> str:
+        buffer = self.buffer
+        index = self.index - buffer.offset
+        terminals = self.terminals
+        # Classes of one character are written as literals
+        lengths = [len(terminal) if isinstance(terminal, (str, bytes)) else 1 for terminal in terminals
+                   if isinstance(terminal, (str, bytes)) or (len(terminal[0]) == 1 and not terminal[1])]
+        if isinstance(buffer.source, memoryview):
+            # Binary input is written as a bytes literal, and its end as is
+            if index >= len(buffer.source):
+                got = "[EOF]"
+            else:
+                got = repr(bytes(buffer.source[index:index + max(lengths + [1])]))
+        else:
+            if index >= len(buffer.source):
+                got = "[EOF]"
+            else:
+                got = buffer.source[index:index + max(lengths + [1])]
+            if lengths:
+                got = "'{}'".format(got)
+        # Different terminals, like a literal and a class of one character, can be written the same
+        expected = sorted(set(describe_terminal(terminal) for terminal in terminals))
+        if len(expected) == 1:
+            expected = expected[0]
+        else:
+            expected = "one of " + ", ".join(expected)
+        # The start of a streamed input may have been released
+        position = buffer._get_position_from_index(index) if index >= 0 else "index {}".format(self.index)
+        return "Failed to parse: expected {}, got {} at {}".format(expected, got, position)
+
+    def __reduce__(self):
+        # The buffer stays behind, so the message is built for the copy
+        return type(self), (None, self.index, tuple(self.terminals), str(self))
 
 
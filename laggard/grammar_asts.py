@@ -1,49 +1,98 @@
-from laggard.ast import ASTNode
+from typing import FrozenSet, List, Tuple
 
+from laggard.ast import ASTNode, ListNode
 
-class Combined(ASTNode): pass
 
+class Combined(ListNode):
+    __slots__ = ()
 
-class Choice(ASTNode): pass
+
+class Choice(ListNode):
+    __slots__ = ()
 
 
 class Rule(ASTNode):
-    def __init__(self, name, content):
-        super().__init__([content])
+    __slots__ = ("name", "content", "transformer")
+    _fields = ("content",)
+    _properties = ("name", "transformer")
+
+    def __init__(self, name, content, transformer=None, start: int = None, end: int = None):
+        super().__init__(start, end)
         self.name = name
+        self.content = content
+        self.transformer = transformer
 
     def get_name(self):
         return "{}: {}".format(super().get_name(), self.name)
 
 
 class ModifiedRuleExpression(ASTNode):
-    def __init__(self, expr:ASTNode, modifier:str):
-        super().__init__([expr, modifier])
+    __slots__ = _fields = ("expr", "modifier")
+
+    def __init__(self, expr: ASTNode, modifier: str, start: int = None, end: int = None):
+        super().__init__(start, end)
         self.expr = expr
         self.modifier = modifier
 
 
 class LabelledRuleExpression(ASTNode):
-    def __init__(self, name: str, expr: ASTNode):
-        super().__init__([name, expr])
+    __slots__ = _fields = ("label", "expr")
+
+    def __init__(self, name: str, expr: ASTNode, start: int = None, end: int = None):
+        super().__init__(start, end)
         self.label = name
         self.expr = expr
 
 
 class RuleLeftHand(ASTNode):
-    def __init__(self, name: str, transformer: str = None):
-        super().__init__([name, transformer])
+    __slots__ = _fields = ("name", "transformer")
+
+    def __init__(self, name: str, transformer: str = None, start: int = None, end: int = None):
+        super().__init__(start, end)
         self.name = name
         self.transformer = transformer
 
+
 class Literal(ASTNode):
-    def __init__(self, value):
-        super(Literal, self).__init__([value])
+    __slots__ = _fields = ("value",)
+
+    def __init__(self, value, start: int = None, end: int = None):
+        super().__init__(start, end)
         self.value = value
 
+
 class Identifier(ASTNode):
-    def __init__(self, name):
-        super(Identifier, self).__init__([name])
+    __slots__ = _fields = ("name",)
+
+    def __init__(self, name, start: int = None, end: int = None):
+        super().__init__(start, end)
         self.name = name
 
-class Grammar(ASTNode): pass
\ No newline at end of file
+
+class CharacterClass(ASTNode):
+    """
+    Matches one character within any of `ranges`, or with `negated`, one within none of them.
+    Written like `[a-zA-Z_]` or `[^"]`; each range is the first and last character it includes.
+    """
+
+    __slots__ = _fields = ("ranges", "negated")
+
+    def __init__(self, ranges: List[Tuple[str, str]], negated: bool = False, start: int = None, end: int = None):
+        super().__init__(start, end)
+        self.ranges = ranges
+        self.negated = negated
+
+    @property
+    def chars(self) -> FrozenSet[str]:
+        """The characters within the ranges, whether or not the class is negated."""
+        return frozenset(chr(c) for first, last in self.ranges for c in range(ord(first), ord(last) + 1))
+
+
+class Cut(ASTNode):
+    """Commits to the innermost choice alternative, optional or repetition item around it, written `~`."""
+
+    __slots__ = ()
+
+
+class Grammar(ListNode):
+    __slots__ = ()
@@ -1,44 +1,68 @@
+import re
 import string
 
 from laggard.buffer import Buffer
 from laggard.exceptions import ParseException
 from laggard.grammar_asts import Combined, Choice, Rule, ModifiedRuleExpression, LabelledRuleExpression, Grammar, \
-    Identifier, Literal
+    Identifier, Literal, Cut, RuleLeftHand, CharacterClass
 from laggard.helpers import expectManyOutOf, expect, parseMultipleOf, expectOneOf, parseUntil
 
+#: The characters written after a backslash in a literal or character class, for those which cannot be written
+#: as themselves. Any other character after a backslash stands for itself, except `x`, which begins two hex digits.
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+_ESCAPE = re.compile(r"\\(x[0-9a-fA-F]{2}|.)", re.DOTALL)
+
 
 class Parser:
     def __init__(self, source: str):
         self.buffer = Buffer(source, skip=[" ", "\n", "\t"])
 
+    def _start(self) -> int:
+        """The offset of the next character that is not skipped, where a node parsed from here begins."""
+        buffer = self.buffer
+        index = buffer.current_index
+        while index < len(buffer.source) and buffer.source[index] in buffer.skip:
+            index += 1
+        return buffer.offset + index
+
+    def _span(self, node, start: int):
+        """Records the offsets of the text `node` was parsed from, which ends at the current index."""
+        node.start = start
+        node.end = self.buffer.offset + self.buffer.current_index
+        return node
+
     def parse(self):
+        start = self._start()
         retval = []
         try:
             while True:
                 retval.append(self.parse_rule())
         except ParseException:
             if self.buffer.is_eof():
-                return Grammar(retval)
+                return self._span(Grammar(retval), start)
             raise
 
     def parse_rule(self):
         with self.buffer:
-            x = []
-            x.append(self.parse_identifier())
+            start = self._start()
+            lefthand = self.parse_lefthand()
             expect(self.buffer, "=")
-            x.append(self.parse_righthand())
+            content = self.parse_righthand()
             expect(self.buffer, ";")
-            return Rule(*x)
+            return self._span(Rule(lefthand.name, content, lefthand.transformer), start)
 
     def parse_lefthand(self):
         with self.buffer:
+            start = self._start()
             name = self.parse_identifier()
             try:
-                expect(self.buffer, ":")
-                transformer = self.parse_identifier()
-                return
+                with self.buffer:
+                    expect(self.buffer, ":")
+                    transformer = self.parse_identifier()
             except ParseException:
-                return name
+                transformer = None
+            return self._span(RuleLeftHand(name, transformer), start)
 
     def parse_righthand(self):
         with self.buffer:
@@ -46,10 +70,11 @@ class Parser:
 
     def parse_choice(self):
         with self.buffer:
+            start = self._start()
             x = self.parse_combination()
             try:
                 y = parseMultipleOf(self.buffer, self.parse_choice_fragment)
-                return Choice([x] + y)
+                return self._span(Choice([x] + y), start)
             except ParseException:
                 return x
 
@@ -60,19 +85,21 @@ class Parser:
 
     def parse_combination(self):
         with self.buffer:
+            start = self._start()
             x = self.parse_modified_rule_expression()
             try:
                 y = parseMultipleOf(self.buffer, self.parse_modified_rule_expression)
-                return Combined([x] + y)
+                return self._span(Combined([x] + y), start)
             except ParseException:
                 return x
 
     def parse_modified_rule_expression(self):
         with self.buffer:
+            start = self._start()
             expr = self.parse_rule_match_expression()
             try:
                 sym = expectOneOf(self.buffer, ["*", "+", "?"], skip=False)
-                return ModifiedRuleExpression(expr, sym)
+                return self._span(ModifiedRuleExpression(expr, sym), start)
             except:
                 return expr
 
@@ -80,6 +107,7 @@ class Parser:
 
     def parse_rule_match_expression(self):
         with self.buffer:
+            start = self._start()
             try:
                 expect(self.buffer, "(")
                 x = self.parse_choice()
@@ -91,16 +119,81 @@ class Parser:
                     try:
                         expect(self.buffer, ":")
                         expr = self.parse_modified_rule_expression()
-                        return LabelledRuleExpression(name, expr)
+                        return self._span(LabelledRuleExpression(name, expr), start)
                     except ParseException:
                         return name
                 except ParseException:
-                    return self.parse_string()
+                    try:
+                        return self.parse_string()
+                    except ParseException:
+                        try:
+                            return self.parse_character_class()
+                        except ParseException:
+                            expect(self.buffer, "~")
+                            return self._span(Cut(), start)
 
     def parse_identifier(self):
-        return Identifier(expectManyOutOf(self.buffer, list(string.ascii_letters + string.digits)))
+        start = self._start()
+        return self._span(Identifier(expectManyOutOf(self.buffer, list(string.ascii_letters + string.digits))), start)
 
     def parse_string(self):
         with self.buffer:
+            start = self._start()
             x = expectOneOf(self.buffer, ["'", '"'])
-            return Literal(parseUntil(self.buffer, [x]))
+            return self._span(Literal(self.unescape(parseUntil(self.buffer, [x]))), start)
+
+    def unescape(self, text: str) -> str:
+        """The value of a literal written as `text`, with its backslash escapes, like \\n and \\x00, interpreted."""
+        if "\\" not in text:
+            return text
+        return _ESCAPE.sub(self._escaped, text)
+
+    def _escaped(self, match) -> str:
+        escape = match.group(1)
+        if escape == "x":
+            self.buffer.cry("expected two hex digits after '\\x' in literal")
+        elif len(escape) == 3:
+            return chr(int(escape[1:], 16))
+        return ESCAPES.get(escape, escape)
+
+    def parse_character_class(self):
+        with self.buffer:
+            start = self._start()
+            expect(self.buffer, "[")
+            negated = self.buffer.peek(skip=False) == "^"
+            if negated:
+                self.buffer.fetch_char(skip=False)
+            ranges = []
+            first = self.parse_class_char()
+            while first is not None:
+                last = first
+                # A "-" makes a range, unless it ends the class
+                following = self.buffer.peek(2, skip=False)
+                if following[0] == "-" and following[1:] not in ("]", "[EOF]"):
+                    self.buffer.fetch_char(skip=False)
+                    last = self.parse_class_char()
+                    if last is None or last < first:
+                        self.buffer.cry("invalid range in character class")
+                ranges.append((first, last))
+                first = self.parse_class_char()
+            if not ranges:
+                self.buffer.cry("empty character class")
+            return self._span(CharacterClass(ranges, negated), start)
+
+    def parse_class_char(self):
+        """Reads one character of a character class, which may be escaped, or returns None at the "]" ending it."""
+        c = self.buffer.fetch_char(skip=False)
+        if c == "]":
+            return None
+        if c == "\\":
+            c = self.buffer.fetch_char(skip=False)
+            if c == "x":
+                # Two hex digits, like \x00, for characters of binary input
+                digits = self.buffer.fetch(2, skip=False)
+                if len(digits) < 2 or any(d not in string.hexdigits for d in digits):
+                    self.buffer.cry("expected two hex digits after '\\x' in character class")
+                return chr(int(digits, 16))
+            c = ESCAPES.get(c, c)
+        if c == "[EOF]":
+            self.buffer.cry("expected ']' to end character class")
+        return c
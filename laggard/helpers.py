@@ -1,35 +1,331 @@
-from typing import List, Any, Callable, Union
+import re
+from functools import lru_cache
+from typing import List, Any, Callable, Union, Tuple, Pattern, FrozenSet
 
-from laggard.buffer import Buffer
-from laggard.exceptions import ParseException
+from laggard.buffer import Buffer, BytesBuffer
+from laggard.exceptions import ParseException, ExpectationException
+
+
+class _Fail:
+    """The type of :data:`FAIL`."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return "FAIL"
+
+    def __bool__(self):
+        return False
+
+
+#: Returned instead of a result by rules which did not match, when they do not raise :class:`~laggard.exceptions.ParseException`.
+FAIL = _Fail()
+
+
+def _expected(buffer: Buffer, *expected) -> ExpectationException:
+    """The exception for terminals which did not match after the skipped characters at the buffer's position."""
+    index = buffer.next_index() if buffer.skip else buffer.current_index
+    return ExpectationException(buffer, buffer.offset + index, expected)
 
 
 def expect(buffer: Buffer, literal: str):
-    with buffer:
-        x = buffer.fetch(len(literal), skip="initial")
-        if x == literal:
+    if match(buffer, literal) is FAIL:
+        raise _expected(buffer, literal)
+    return literal
+
+
+def match(buffer: Buffer, literal: str):
+    """
+    Like :func:`expect`, but returns :data:`FAIL` instead of raising, leaving the buffer where it was.
+    Skipped characters are only skipped before the literal, which is compared in place, without copying the source.
+    """
+    index = buffer.next_index() if buffer.skip else buffer.current_index
+    end = index + len(literal)
+    while end > len(buffer.source) and buffer.fill():
+        pass
+    if buffer.source.startswith(literal, index):
+        buffer.current_index = end
+        return literal
+    # The comparison may have examined the whole literal, or found the end of the input
+    reach = end if end <= len(buffer.source) else len(buffer.source) + 1
+    if reach > buffer.reach:
+        buffer.reach = reach
+    # Buffer.expected_at, inlined for the most common failure
+    failure = buffer.offset + index
+    if failure > buffer.failure_index:
+        buffer.failure_index = failure
+        buffer.expected = {literal}
+    elif failure == buffer.failure_index:
+        buffer.expected.add(literal)
+    return FAIL
+
+
+def match_class(buffer: Buffer, charset: FrozenSet[str], negated: bool = False):
+    """
+    Matches one character in `charset` (or, if `negated`, not in it), after any skipped characters.
+    For a :class:`~laggard.buffer.BytesBuffer`, `charset` holds byte values, and the byte is returned as one.
+
+    Returns:
+        The character matched, or :data:`FAIL`, leaving the buffer where it was.
+    """
+    index = buffer.next_index() if buffer.skip else buffer.current_index
+    while index >= len(buffer.source) and buffer.fill():
+        pass
+    if index < len(buffer.source):
+        c = buffer.source[index]
+        if (c in charset) != negated:
+            buffer.current_index = index + 1
+            return c
+    if index >= buffer.reach:
+        buffer.reach = index + 1
+    buffer.expected_at(index, (charset, negated))
+    return FAIL
+
+
+def expect_class(buffer: Buffer, charset: FrozenSet[str], negated: bool = False):
+    """Like :func:`match_class`, but raises :class:`~laggard.exceptions.ParseException` if there is no match."""
+    c = match_class(buffer, charset, negated)
+    if c is FAIL:
+        raise _expected(buffer, (charset, negated))
+    return c
+
+
+class LiteralTable(dict):
+    """
+    The literals of a choice, in order, by their first character, so that only those which begin with the next
+    character of the input are compared with it; see :func:`match_literals`.
+    For binary input, the literals are bytes, and the characters byte values.
+    """
+
+    __slots__ = ("literals",)
+
+    def __init__(self, literals: Tuple[Union[str, bytes], ...]):
+        super().__init__()
+        #: Every literal, in order.
+        self.literals = literals
+        for literal in literals:
+            self.setdefault(literal[0], []).append(literal)
+        for first, candidates in self.items():
+            self[first] = tuple(candidates)
+
+
+def match_literals(buffer: Buffer, table: LiteralTable):
+    """
+    Matches the first of a choice's literals which the input holds, after any skipped characters, as trying each
+    in turn with :func:`match` would, but only compares those which begin with the next character.
+
+    Returns:
+        The literal matched, or :data:`FAIL`, leaving the buffer where it was.
+    """
+    index = buffer.next_index() if buffer.skip else buffer.current_index
+    while index >= len(buffer.source) and buffer.fill():
+        pass
+    # The first character is examined even if no literal begins with it
+    reach = index + 1
+    lookahead = buffer.source[index] if index < len(buffer.source) else buffer.EOF
+    for literal in table.get(lookahead, ()):
+        end = index + len(literal)
+        while end > len(buffer.source) and buffer.fill():
+            pass
+        if buffer.source[index:end] == literal:
+            if reach > buffer.reach:
+                buffer.reach = reach
+            buffer.current_index = end
             return literal
-        else:
-            buffer.cry("expected '{}', got '{}'".format(literal, x))
+        end = end if end <= len(buffer.source) else len(buffer.source) + 1
+        if end > reach:
+            reach = end
+        buffer.expected_at(index, literal)
+    if reach > buffer.reach:
+        buffer.reach = reach
+    # The literals which begin with another character are only worked out if the parse fails here
+    buffer.expected_at(index, (lookahead, table.literals))
+    return FAIL
+
+
+def expect_literals(buffer: Buffer, table: LiteralTable):
+    """Like :func:`match_literals`, but raises :class:`~laggard.exceptions.ParseException` if there is no match."""
+    literal = match_literals(buffer, table)
+    if literal is FAIL:
+        raise _expected(buffer, *table.literals)
+    return literal
+
+
+@lru_cache(maxsize=256)
+def _run_pattern(charset: FrozenSet[str], negated: bool, skip: FrozenSet[str]) -> Pattern:
+    """
+    Compiles a matcher for a run of characters of a class, each after any skipped characters,
+    which ends after the last character of the class.
+    """
+    skip = frozenset(c for c in skip if len(c) == 1)
+    # A skipped character is never the next one compared with the class
+    if negated:
+        body = "[^{}]".format("".join(re.escape(c) for c in sorted(charset | skip)))
+    else:
+        chars = "".join(re.escape(c) for c in sorted(charset - skip))
+        body = "[{}]".format(chars) if chars else "(?!)"
+    if skip:
+        body = "(?:[{}]*{})".format("".join(re.escape(c) for c in sorted(skip)), body)
+    return re.compile(body + "*")
+
+
+def match_run(buffer: Buffer, charset: FrozenSet[str], negated: bool = False, required: bool = False,
+              build: bool = True):
+    """
+    Matches as many characters of a class as there are in a row, like repeating :func:`match_class`,
+    but with one precompiled regular expression.
+
+    Args:
+        buffer: The buffer to read from.
+        charset: The characters of the class.
+        negated: Whether the class is every character not in `charset`.
+        required: Whether at least one character must match.
+        build: Whether to return the characters; if not, None is returned on success.
+
+    Returns:
+        A list of the characters matched, or :data:`FAIL`
+    """
+    pattern = _run_pattern(charset, negated, buffer.skip)
+    start = buffer.current_index
+    while True:
+        match = pattern.match(buffer.source, start)
+        buffer.current_index = match.end()
+        # Examining the character after the run (which records the reach) may read more input, which can continue it
+        length = len(buffer.source)
+        buffer.next_index()
+        if len(buffer.source) == length:
+            break
+    if required and match.end() == start:
+        buffer.current_index = start
+        buffer.expected_at(buffer.next_index(), (charset, negated))
+        return FAIL
+    if not build:
+        return None
+    if buffer.skip:
+        return [c for c in match.group() if c not in buffer.skip]
+    return list(match.group())
+
+
+def expect_run(buffer: Buffer, charset: FrozenSet[str], negated: bool = False, required: bool = False,
+               build: bool = True):
+    """Like :func:`match_run`, but raises :class:`~laggard.exceptions.ParseException` if there is no match."""
+    result = match_run(buffer, charset, negated, required, build)
+    if result is FAIL:
+        raise _expected(buffer, (charset, negated))
+    return result
+
+
+def expect_bytes(buffer: BytesBuffer, literal: bytes):
+    """Like :func:`expect`, for binary input."""
+    if match_bytes(buffer, literal) is FAIL:
+        raise _expected(buffer, literal)
+    return literal
+
+
+def match_bytes(buffer: BytesBuffer, literal: bytes):
+    """Like :func:`match`, for binary input; the literal is compared with a memoryview of the source, not a copy."""
+    index = buffer.next_index() if buffer.skip else buffer.current_index
+    end = index + len(literal)
+    if buffer.source[index:end] == literal:
+        buffer.current_index = end
+        return literal
+    reach = end if end <= len(buffer.source) else len(buffer.source) + 1
+    if reach > buffer.reach:
+        buffer.reach = reach
+    buffer.expected_at(index, literal)
+    return FAIL
+
+
+@lru_cache(maxsize=256)
+def _byte_run_pattern(charset: FrozenSet[int], negated: bool, skip: FrozenSet[int]) -> Pattern:
+    """Like :func:`_run_pattern`, for byte values."""
+    if negated:
+        body = b"[^" + b"".join(re.escape(bytes([c])) for c in sorted(charset | skip)) + b"]"
+    else:
+        chars = b"".join(re.escape(bytes([c])) for c in sorted(charset - skip))
+        body = b"[" + chars + b"]" if chars else b"(?!)"
+    if skip:
+        body = b"(?:[" + b"".join(re.escape(bytes([c])) for c in sorted(skip)) + b"]*" + body + b")"
+    return re.compile(body + b"*")
+
+
+def match_byte_run(buffer: BytesBuffer, charset: FrozenSet[int], negated: bool = False, required: bool = False,
+                   build: bool = True):
+    """
+    Like :func:`match_run`, for binary input.
+
+    Returns:
+        A memoryview of the bytes matched, which is a slice of the source unless skipped bytes lie between them,
+        or :data:`FAIL`
+    """
+    start = buffer.current_index
+    end = _byte_run_pattern(charset, negated, buffer.skip).match(buffer.source, start).end()
+    buffer.current_index = end
+    # Records the reach, at the byte after the run
+    buffer.next_index()
+    if required and end == start:
+        buffer.current_index = start
+        buffer.expected_at(buffer.next_index(), (charset, negated))
+        return FAIL
+    if not build:
+        return None
+    if buffer.skip:
+        skip = buffer.skip
+        return memoryview(bytes(c for c in buffer.source[start:end] if c not in skip))
+    return buffer.source[start:end]
+
+
+def expect_byte_run(buffer: BytesBuffer, charset: FrozenSet[int], negated: bool = False, required: bool = False,
+                    build: bool = True):
+    """Like :func:`match_byte_run`, but raises :class:`~laggard.exceptions.ParseException` if there is no match."""
+    result = match_byte_run(buffer, charset, negated, required, build)
+    if result is FAIL:
+        raise _expected(buffer, (charset, negated))
+    return result
+
+
+@lru_cache(maxsize=256)
+def _charset_pattern(charset: Tuple[str, ...], skip: Tuple[str, ...], many: bool) -> Pattern:
+    """
+    Compiles a matcher for any `skip` characters, followed by one (or a run of) `charset` characters.
+    The pattern always matches; group 1 holds the `charset` characters, or is None if there were none.
+    """
+    chars = "".join(re.escape(c) for c in charset if len(c) == 1)
+    body = "[{}]".format(chars) if chars else "(?!)"
+    if many:
+        body += "+"
+    skip_chars = "".join(re.escape(c) for c in skip if len(c) == 1)
+    return re.compile("[{}]*({})?".format(skip_chars, body) if skip_chars else "({})?".format(body))
+
+
+def _scan(buffer: Buffer, pattern: Pattern):
+    """Matches `pattern` at the buffer's position, reading more input while the match reaches the end of it."""
+    match = pattern.match(buffer.source, buffer.current_index)
+    while match.end() >= len(buffer.source) and buffer.fill():
+        match = pattern.match(buffer.source, buffer.current_index)
+    return match
+
+
+def _scan_charset(buffer: Buffer, charset: List[str], skip: bool, many: bool, span: bool = False):
+    match = _scan(buffer, _charset_pattern(tuple(charset), tuple(buffer.skip) if skip else (), many))
+    # The match ended at a character it examined, or at the end of the input
+    if match.end() >= buffer.reach:
+        buffer.reach = match.end() + 1
+    if match.group(1) is None:
+        terminal = (frozenset(charset), False)
+        buffer.expected_at(match.end(), terminal)
+        raise ExpectationException(buffer, buffer.offset + match.end(), (terminal,))
+    buffer.current_index = match.end()
+    if span:
+        return buffer.span(match.start(1))
+    return match.group(1)
 
 
 def expectOneOf(buffer: Buffer, charset: List[str], skip: bool = True):
-    with buffer:
-        x = buffer.fetch_char(skip)
-        if x in charset:
-            return x
-        else:
-            buffer.cry("expected one of {}, got {}".format(', '.join(charset), x))
+    return _scan_charset(buffer, charset, skip, False)
 
 
-def expectManyOutOf(buffer: Buffer, charset: List[str]):
-    with buffer:
-        v = expectOneOf(buffer, charset, skip=True)
-        try:
-            while True:
-                v += expectOneOf(buffer, charset, skip=False)
-        except ParseException:
-            return v
+def expectManyOutOf(buffer: Buffer, charset: List[str], span: bool = False):
+    return _scan_charset(buffer, charset, True, True, span)
 
 
 def parseMultipleOf(buffer: Buffer, parser: Callable, accept_none: bool = False):
@@ -45,14 +341,34 @@ def parseMultipleOf(buffer: Buffer, parser: Callable, accept_none: bool = False)
                 return parses
 
 
-def parseUntil(buffer: Buffer, charset: List[str]):
-    with buffer:
-        return_val = ""
-        last_char = None
-        while last_char not in charset:
-            last_char = buffer.fetch_char(False)
-            return_val += last_char
-        return return_val[:-1]
+def parseUntil(buffer: Buffer, charset: List[str], span: bool = False):
+    start = buffer.current_index
+    searched = start
+    while True:
+        source = buffer.source
+        # The earliest occurrence of any of the characters ends the run
+        end = -1
+        for c in charset:
+            if len(c) != 1:
+                continue
+            found = source.find(c, searched, end if end != -1 else len(source))
+            if found != -1:
+                end = found
+        if end != -1:
+            break
+        searched = len(source)
+        if not buffer.fill():
+            buffer.reach = len(source) + 1
+            terminal = (frozenset(charset), False)
+            buffer.expected_at(len(source), terminal)
+            raise ExpectationException(buffer, buffer.offset + len(source), (terminal,))
+    if span:
+        buffer.current_index = end
+        result = buffer.span(start)
+        buffer.current_index += 1
+        return result
+    buffer.current_index = end + 1
+    return source[start:end]
 
 
 class OptionallyNamedTuple:
@@ -1,10 +1,127 @@
-def compile_grammar(grammar: str):
+import functools
+import hashlib
+import importlib.util
+import os
+import py_compile
+import sys
+import tempfile
+import types
+from typing import Type, Dict
+
+import laggard
+from laggard import grammar_parser
+from laggard.abstracts import Parser
+from laggard.codegen import CodeGenerator
+
+#: Parser classes compiled (or loaded) by this process, by cache key.
+_compiled: Dict[str, Type[Parser]] = {}
+
+
+def default_cache_dir() -> str:
+    """
+    The directory compiled parsers are cached in: $LAGGARD_CACHE_DIR if it is set,
+    otherwise `laggard` in the user's cache directory.
+    """
+    try:
+        return os.environ["LAGGARD_CACHE_DIR"]
+    except KeyError:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(base, "laggard")
+
+
+@functools.lru_cache(maxsize=None)
+def _generator_hash() -> str:
+    """
+    A hash of the source of every module of laggard, so that a cached parser is only reused if nothing which
+    generated it, or which it uses, has changed since.
+    """
+    h = hashlib.sha256()
+    package = os.path.dirname(laggard.__file__)
+    for name in sorted(os.listdir(package)):
+        if name.endswith(".py"):
+            h.update(name.encode("utf-8"))
+            with open(os.path.join(package, name), "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+
+def _cache_key(grammar: str, options: dict) -> str:
+    h = hashlib.sha256()
+    for part in (laggard.__version__, _generator_hash(), repr(sorted(options.items())), grammar):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _generate_source(grammar: str, options: dict) -> str:
+    return CodeGenerator(grammar_parser.Parser(grammar).parse(), **options).generate()
+
+
+def _write_module(path: str, source: str):
+    """Writes the module source, and compiles its bytecode, without other processes ever seeing part of either."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(source)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    py_compile.compile(path, doraise=True)
+
+
+def _load_module(module_name: str, path: str) -> types.ModuleType:
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    # Registered, so that the parser class can be pickled by reference
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def compile_grammar(grammar: str, cache_dir: str = None, use_cache: bool = True, **options) -> Type[Parser]:
     """
     Compiles a grammar, given in string form, into a parser class.
 
+    The generated module is cached on disk, with its bytecode, keyed by a hash of the grammar, the options, the
+    version of laggard and the source of its modules. Later calls, in this or any other process, load it from there
+    without parsing the grammar or generating any code.
+
     Args:
         grammar: The grammar
+        cache_dir: Where the compiled modules are kept, by default :func:`default_cache_dir`.
+        use_cache: Whether to use the on-disk cache at all.
+        options: Passed on to :class:`~laggard.codegen.CodeGenerator`.
 
     Returns:
         A class descending from Parser
     """
+    key = _cache_key(grammar, options)
+    try:
+        return _compiled[key]
+    except KeyError:
+        pass
+
+    module_name = "laggard_parser_{}".format(key)
+    module = None
+    if use_cache:
+        path = os.path.join(cache_dir or default_cache_dir(), module_name + ".py")
+        try:
+            if not os.path.exists(path):
+                _write_module(path, _generate_source(grammar, options))
+            module = _load_module(module_name, path)
+        except OSError:
+            # An unwritable cache only costs the time it would have saved
+            module = None
+
+    if module is None:
+        module = types.ModuleType(module_name)
+        exec(compile(_generate_source(grammar, options), module_name, "exec"), module.__dict__)
+        sys.modules[module_name] = module
+
+    parser = _compiled[key] = module.MyParser
+    # So that worker processes can compile the same class, see laggard.batch
+    parser.grammar = grammar
+    parser.grammar_options = dict(options, cache_dir=cache_dir, use_cache=use_cache)
+    return parser
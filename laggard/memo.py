@@ -0,0 +1,443 @@
+import copy
+import functools
+from collections import namedtuple, OrderedDict
+from typing import Any, Optional
+
+from laggard.ast import ASTNode, ListNode
+from laggard.buffer import Buffer, Span
+from laggard.exceptions import ParseException
+from laggard.helpers import FAIL, OptionallyNamedTuple
+
+MemoEntry = namedtuple("MemoEntry", ["result", "end", "extent", "failure"])
+"""
+A memoised rule application. For a failed application, `end` is None and `result` holds the raised exception, or FAIL.
+`extent` is the index just past every character the application examined (see :attr:`Buffer.reach
+<laggard.buffer.Buffer.reach>`), or None if it is not known.
+`failure` is the farthest index at which a terminal failed during the application, and the terminals expected there
+(see :meth:`Buffer.expected_at <laggard.buffer.Buffer.expected_at>`), or None if none did; they are recorded in the
+buffer again when the entry is used, so that errors are reported as if the rule had been applied.
+Indices are into the whole input, rather than the buffer's window of it.
+"""
+MemoEntry.__new__.__defaults__ = (None, None)
+
+
+class MemoTable:
+    """
+    Stores the results of rule applications, keyed by (rule name, buffer index).
+    Used by parsers generated in packrat mode, see :func:`memoize`.
+    This class keeps every entry; subclasses implement the bounded policies.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, rule: str, index: int) -> Optional[MemoEntry]:
+        return self.entries.get((rule, index))
+
+    def put(self, rule: str, index: int, entry: MemoEntry):
+        self.entries[(rule, index)] = entry
+
+    def prune(self, committed: int):
+        """Removes every entry at an index before `committed`."""
+        for key in [key for key in self.entries if key[1] < committed]:
+            del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
+
+    def items(self):
+        """Iterates over ((rule, index), entry) for every entry."""
+        return iter(self.entries.items())
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class LRUMemoTable(MemoTable):
+    """
+    Keeps at most `maxsize` entries, evicting the least recently used.
+    """
+
+    def __init__(self, maxsize: int = 65536):
+        super().__init__()
+        self.entries = OrderedDict()
+        self.maxsize = maxsize
+
+    def get(self, rule: str, index: int) -> Optional[MemoEntry]:
+        key = (rule, index)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, rule: str, index: int, entry: MemoEntry):
+        self.entries[(rule, index)] = entry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+class CommittedMemoTable(MemoTable):
+    """
+    Drops entries which lie behind the committed position of the buffer.
+
+    The buffer can only move backwards to a position recorded on its stack, so no rule will be applied again
+    at an index lower than the oldest mark (or the current index, if nothing is marked).
+    Entries are grouped by index, and the table is swept every `interval` insertions.
+    """
+
+    def __init__(self, buffer: Buffer, interval: int = 1024):
+        super().__init__()
+        self.buffer = buffer
+        self.interval = interval
+        self._size = 0
+        self._until_sweep = interval
+
+    def get(self, rule: str, index: int) -> Optional[MemoEntry]:
+        try:
+            return self.entries[index].get(rule)
+        except KeyError:
+            return None
+
+    def put(self, rule: str, index: int, entry: MemoEntry):
+        try:
+            at_index = self.entries[index]
+        except KeyError:
+            at_index = self.entries[index] = {}
+        if rule not in at_index:
+            self._size += 1
+        at_index[rule] = entry
+        self._until_sweep -= 1
+        if self._until_sweep <= 0:
+            self.prune(self.committed_index)
+
+    @property
+    def committed_index(self) -> int:
+        """The lowest index in the whole input that the buffer may still return to."""
+        if self.buffer.stack:
+            return self.buffer.offset + min(self.buffer.stack[0], self.buffer.current_index)
+        return self.buffer.offset + self.buffer.current_index
+
+    def prune(self, committed: int):
+        """Removes every entry at an index before `committed`."""
+        for index in [i for i in self.entries if i < committed]:
+            self._size -= len(self.entries.pop(index))
+        self._until_sweep = self.interval
+
+    def clear(self):
+        super().clear()
+        self._size = 0
+        self._until_sweep = self.interval
+
+    def items(self):
+        for index, at_index in self.entries.items():
+            for rule, entry in at_index.items():
+                yield (rule, index), entry
+
+    def __len__(self):
+        return self._size
+
+
+def _rebase(result: Any, shift: int) -> Any:
+    """
+    A copy of a result in which the offsets of the :class:`~laggard.buffer.Span` and AST nodes it holds are moved by
+    `shift`, within the lists, tuples and :class:`~laggard.helpers.OptionallyNamedTuple` which generated rules build.
+    Anything else is returned as it is.
+    """
+    if isinstance(result, Span):
+        return Span(result.source, result.start + shift, result.end + shift, result._base + shift)
+    elif isinstance(result, list):
+        return [_rebase(item, shift) for item in result]
+    elif type(result) is tuple:
+        return tuple(_rebase(item, shift) for item in result)
+    elif isinstance(result, OptionallyNamedTuple):
+        rebased = copy.copy(result)
+        rebased._results = _rebase(result._results, shift)
+        return rebased
+    elif isinstance(result, ASTNode):
+        rebased = copy.copy(result)
+        if result.start is not None:
+            rebased.start = result.start + shift
+        if result.end is not None:
+            rebased.end = result.end + shift
+        if isinstance(result, ListNode):
+            rebased.children = _rebase(result.children, shift)
+        for field in result._fields:
+            setattr(rebased, field, _rebase(getattr(result, field), shift))
+        return rebased
+    return result
+
+
+class EditedMemoTable(MemoTable):
+    """
+    Reuses the entries of the memo table of a previous parse, for a source which has since been edited.
+
+    An entry is only reused if the text it examined is unchanged: entries before the edit must not have looked at
+    the text it changed, and entries after it are moved by the change in length, along with the offsets in their
+    results (see :func:`_rebase`) unless they hold none. New entries are stored in
+    `current`, a table of the parser's own policy. Nothing is copied, so creating the table takes constant time.
+    """
+
+    #: How many edits can be layered before the previous entries are collected into one table.
+    MAX_DEPTH = 16
+
+    def __init__(self, previous: MemoTable, current: MemoTable, offset: int, deleted: int, inserted: int,
+                 rebase: bool = True):
+        """
+        Args:
+            previous: The memo table of the parse of the source before the edit.
+            current: An empty table for new entries.
+            offset: Where the edit begins.
+            deleted: The number of characters the edit removed.
+            inserted: The number of characters the edit inserted.
+            rebase: Whether results may hold offsets, which must be moved.
+        """
+        super().__init__()
+        self.depth = previous.depth + 1 if isinstance(previous, EditedMemoTable) else 1
+        if self.depth > self.MAX_DEPTH:
+            flattened = MemoTable()
+            flattened.entries = dict(previous.items())
+            previous = flattened
+            self.depth = 1
+        self.previous = previous
+        self.current = current
+        self.offset = offset
+        self.edit_end = offset + inserted
+        self.shift = inserted - deleted
+        self.rebase = rebase
+
+    def _translate(self, rule: str, index: int) -> Optional[MemoEntry]:
+        """The previous entry for the rule at the (new) index, if it is still valid, moved to the new source."""
+        if index < self.offset:
+            entry = self.previous.get(rule, index)
+            if entry is not None and entry.extent is not None and entry.extent <= self.offset:
+                return entry
+        elif index >= self.edit_end:
+            entry = self.previous.get(rule, index - self.shift)
+            if entry is not None:
+                shift = self.shift
+                if entry.end is None or not shift or not self.rebase:
+                    result = entry.result
+                else:
+                    result = _rebase(entry.result, shift)
+                failure = entry.failure
+                if failure is not None:
+                    failure = (failure[0] + shift, failure[1])
+                return MemoEntry(result, None if entry.end is None else entry.end + shift,
+                                 None if entry.extent is None else entry.extent + shift, failure)
+        return None
+
+    def get(self, rule: str, index: int) -> Optional[MemoEntry]:
+        entry = self.current.get(rule, index)
+        if entry is None:
+            entry = self._translate(rule, index)
+        return entry
+
+    def put(self, rule: str, index: int, entry: MemoEntry):
+        self.current.put(rule, index, entry)
+
+    def prune(self, committed: int):
+        self.current.prune(committed)
+
+    def clear(self):
+        self.current.clear()
+
+    def items(self):
+        for (rule, index), entry in self.previous.items():
+            new_index = index if index < self.offset else index + self.shift
+            if self.current.get(rule, new_index) is None:
+                entry = self._translate(rule, new_index)
+                if entry is not None:
+                    yield (rule, new_index), entry
+        yield from self.current.items()
+
+    def __len__(self):
+        return len(self.current)
+
+
+MEMO_POLICIES = ("unbounded", "lru", "committed")
+
+
+def create_memo(policy: str, buffer: Buffer, size: int = None) -> MemoTable:
+    """
+    Creates a memo table for the given policy.
+
+    Args:
+        policy: One of "unbounded", "lru" or "committed".
+        buffer: The buffer the parser reads from.
+        size: The maximum number of entries for "lru", or the sweep interval for "committed".
+
+    Returns:
+        A new, empty :class:`MemoTable`
+    """
+    if policy == "unbounded" or policy is None:
+        return MemoTable()
+    elif policy == "lru":
+        return LRUMemoTable(size) if size is not None else LRUMemoTable()
+    elif policy == "committed":
+        return CommittedMemoTable(buffer, size) if size is not None else CommittedMemoTable(buffer)
+    raise ValueError("Unknown memo policy '{}', expected one of {}".format(policy, ", ".join(MEMO_POLICIES)))
+
+
+def _record_failure(buffer: Buffer, failure_index: int, expected):
+    """Merges the terminals expected at an index into the buffer's farthest failure, as they were recorded."""
+    if failure_index > buffer.failure_index:
+        buffer.failure_index = failure_index
+        buffer.expected = set(expected)
+    elif failure_index == buffer.failure_index:
+        buffer.expected.update(expected)
+
+
+def _own_failure(buffer: Buffer, failure_index: int, expected):
+    """
+    The farthest failure recorded by a rule application, for its memo entry, after which the buffer's is put back
+    to the farther of it and the one before the application, `failure_index` with `expected`.
+    """
+    if buffer.failure_index < 0:
+        buffer.failure_index, buffer.expected = failure_index, expected
+        return None
+    failure = (buffer.failure_index, frozenset(buffer.expected))
+    if failure_index > buffer.failure_index:
+        buffer.failure_index, buffer.expected = failure_index, expected
+    elif failure_index == buffer.failure_index:
+        expected.update(buffer.expected)
+        buffer.expected = expected
+    return failure
+
+
+def memoize(func):
+    """
+    Decorates a parser method, so that its result at each buffer index is computed only once.
+    Failures are remembered too, and re-raised (or :data:`~laggard.helpers.FAIL` returned again) on later attempts at the same index.
+    The parser must have a `memo` attribute holding a :class:`MemoTable`.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self):
+        buffer = self.buffer
+        index = buffer.offset + buffer.current_index
+        entry = self.memo.get(name, index)
+        if entry is not None:
+            if entry.extent is not None and entry.extent - buffer.offset > buffer.reach:
+                buffer.reach = entry.extent - buffer.offset
+            if entry.failure is not None:
+                _record_failure(buffer, *entry.failure)
+            if entry.end is None:
+                if entry.result is FAIL:
+                    return FAIL
+                raise entry.result.with_traceback(None)
+            buffer.current_index = entry.end - buffer.offset
+            return entry.result
+        # Measure how far this application looks, and where it fails, on its own, then add them to the caller's
+        reach = buffer.offset + buffer.reach
+        buffer.reach = 0
+        failure_index, expected = buffer.failure_index, buffer.expected
+        buffer.failure_index = -1
+        try:
+            result = func(self)
+        except ParseException as e:
+            extent = buffer.offset + max(buffer.reach, buffer.current_index)
+            buffer.reach = max(reach, extent) - buffer.offset
+            self.memo.put(name, index, MemoEntry(e, None, extent, _own_failure(buffer, failure_index, expected)))
+            raise
+        extent = buffer.offset + max(buffer.reach, buffer.current_index)
+        buffer.reach = max(reach, extent) - buffer.offset
+        failure = _own_failure(buffer, failure_index, expected)
+        if result is FAIL:
+            self.memo.put(name, index, MemoEntry(FAIL, None, extent, failure))
+            return FAIL
+        self.memo.put(name, index, MemoEntry(result, buffer.offset + buffer.current_index, extent, failure))
+        return result
+
+    return wrapper
+
+
+def _item(parser, item: str):
+    """
+    Applies the rule or fragment named `item` once, leaving the buffer where it was if it fails.
+
+    Returns:
+        The result, or :data:`~laggard.helpers.FAIL` with the exception raised in exception mode, if any.
+    """
+    buffer = parser.buffer
+    buffer.mark()
+    try:
+        result = getattr(parser, item)()
+    except ParseException as e:
+        buffer.abandon()
+        return FAIL, e
+    if result is FAIL:
+        buffer.abandon()
+        return FAIL, None
+    buffer.commit()
+    return result, None
+
+
+# The memoized function matching each run, by (item, site, level, build), see _run
+_runs = {}
+
+
+def _run(item: str, site: str, level: int, build: bool):
+    """
+    The memoized parser method which matches a run of up to 2 ** `level` items of the repetition at `site`, as two runs
+    of the level below, and returns their results (or how many matched, if they are not built), and whether there were
+    that many. Memoized as `site~level`.
+    """
+    key = (item, site, level, build)
+    try:
+        return _runs[key]
+    except KeyError:
+        pass
+    if level == 1:
+        def half(parser):
+            result, _ = _item(parser, item)
+            if result is FAIL:
+                return [] if build else 0, False
+            return [result] if build else 1, True
+    else:
+        half = _run(item, site, level - 1, build)
+
+    def run(parser):
+        first, full = half(parser)
+        if not full:
+            return first, False
+        second, full = half(parser)
+        return first + second, full
+
+    run.__name__ = "{}~{}".format(site, level)
+    _runs[key] = memoize(run)
+    return _runs[key]
+
+
+def repeat(parser, item: str, site: str, build: bool = True, required: bool = False):
+    """
+    Matches a repetition of the rule or fragment named `item`, for parsers generated in packrat mode, as runs of
+    1, 2, 4, 8... items, each of which is memoized. After an edit, the runs which do not examine the edited text
+    are reused whole, so a document of n items is parsed again with O(log n) memo lookups, rather than one per item.
+    An edit which adds or removes items moves the runs after it, which are then matched again from their items.
+
+    Args:
+        parser: The parser, whose memo table holds the runs.
+        item: The name of the parser method matching one item.
+        site: A name for the repetition, unique within the parser class.
+        build: Whether to return the items' results, rather than whether any matched.
+        required: Whether at least one item must match (`+`); if none does, the repetition fails as the item did.
+
+    Returns:
+        The list of results, or whether any item matched if they are not built, or FAIL.
+    """
+    first, error = _item(parser, item)
+    if first is FAIL:
+        if not required:
+            return [] if build else False
+        if error is not None:
+            raise error
+        return FAIL
+    results = [first] if build else 1
+    level = 1
+    while True:
+        run, full = _run(item, site, level, build)(parser)
+        results += run
+        if not full:
+            return results if build else True
+        level += 1
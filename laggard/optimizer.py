@@ -0,0 +1,237 @@
+import copy
+from typing import Dict, Iterable, List, Set
+
+from laggard.ast import ASTNode
+from laggard.analysis import TEXT, DISCARD, has_cut
+from laggard.grammar_asts import Grammar, Combined, Choice, ModifiedRuleExpression, LabelledRuleExpression, Identifier, \
+    Literal, Rule, CharacterClass
+
+#: The passes of :class:`GrammarOptimizer`, in the order they run.
+PASSES = ("flatten", "concatenate", "share", "prune")
+
+#: The rule the parse begins with, from which the others must be reachable.
+START = "start"
+
+
+def _rule_name(rule: Rule) -> str:
+    return rule.name.name if isinstance(rule.name, Identifier) else rule.name
+
+
+def _count(node: ASTNode) -> int:
+    return sum(1 for _, item in node.walk() if isinstance(item, ASTNode))
+
+
+def _key(node) -> tuple:
+    """A value which is equal for equal expressions, whatever text they were parsed from."""
+    if isinstance(node, (Combined, Choice)):
+        return (type(node),) + tuple(_key(child) for child in node.children)
+    elif isinstance(node, ModifiedRuleExpression):
+        return type(node), node.modifier, _key(node.expr)
+    elif isinstance(node, LabelledRuleExpression):
+        return type(node), node.label.name if isinstance(node.label, Identifier) else node.label, _key(node.expr)
+    elif isinstance(node, Identifier):
+        return type(node), node.name
+    elif isinstance(node, Literal):
+        return type(node), node.value
+    elif isinstance(node, CharacterClass):
+        return type(node), tuple(node.ranges), node.negated
+    return (type(node),)
+
+
+class GrammarOptimizer:
+    """
+    Rewrites a grammar, before code is generated for it, so that the parser has fewer nodes to match and
+    fewer functions to call. Each pass is optional:
+
+    - "flatten" splices choices into the choices they are alternatives of, and drops choices of one alternative.
+      Within rules whose result is never built, it does the same for sequences.
+    - "concatenate" joins adjacent literals into one, within rules whose result is never built.
+    - "share" moves an expression written more than once into a rule of its own, which each place then calls;
+      a rule whose whole expression it is, and which has no transformer, is called instead.
+    - "prune" removes the rules which cannot be reached from `start`.
+
+    The results of the rules which are built do not change. Rules with the `text` or `discard` transformer,
+    or one of `text_transformers`, build none, so only the text they match must stay the same.
+    The generated parser's buffer skips nothing, so "ab" matches the same text as "a" "b".
+
+    Examples:
+        To see what each pass removed::
+
+            optimizer = GrammarOptimizer()
+            grammar = optimizer.optimize(grammar_parser.Parser(source).parse())
+            print(optimizer.report())
+    """
+
+    def __init__(self, passes: Iterable[str] = PASSES, text_transformers: Iterable[str] = (),
+                 min_shared_size: int = 8):
+        """
+        Args:
+            passes: The passes to run, from :data:`PASSES`; they always run in that order.
+            text_transformers: Transformers which are given the text a rule matched, as for
+                :class:`~laggard.codegen.CodeGenerator`.
+            min_shared_size: The fewest nodes an expression must have to be shared; smaller ones are cheaper to match
+                where they are written than to call.
+        """
+        unknown = set(passes) - set(PASSES)
+        if unknown:
+            raise ValueError("Unknown optimizer passes {}".format(", ".join(sorted(unknown))))
+        self.passes = [name for name in PASSES if name in passes]
+        self.unbuilt = {TEXT, DISCARD} | set(text_transformers)
+        self.min_shared_size = min_shared_size
+        #: The number of nodes each pass removed, by name, after :meth:`optimize`.
+        self.removed: Dict[str, int] = {}
+
+    def optimize(self, root: Grammar) -> Grammar:
+        """Runs the passes over a grammar, which is left as it was, and returns the optimized copy."""
+        root = copy.deepcopy(root)
+        self.removed = {}
+        for name in self.passes:
+            before = _count(root)
+            getattr(self, "_" + name)(root)
+            self.removed[name] = before - _count(root)
+        return root
+
+    def report(self) -> str:
+        """Describes how many nodes each pass removed. Only meaningful after :meth:`optimize`."""
+        return "\n".join("{}: {} nodes removed".format(name, count) for name, count in self.removed.items())
+
+    def _built(self, rule: Rule) -> bool:
+        """Whether the rule builds the result of its expression."""
+        transformer = rule.transformer.name if isinstance(rule.transformer, Identifier) else rule.transformer
+        return transformer not in self.unbuilt
+
+    def _rewrite(self, root: Grammar, rewrite):
+        """Replaces each rule's expression with `rewrite(node, built)`, applied to every node from the leaves up."""
+        for rule in root.children:
+            rule.content = self._rewrite_node(rule.content, rewrite, self._built(rule))
+
+    def _rewrite_node(self, node, rewrite, built: bool):
+        if isinstance(node, (Combined, Choice)):
+            children = [self._rewrite_node(child, rewrite, built) for child in node.children]
+            if any(new is not old for new, old in zip(children, node.children)):
+                node = type(node)(children, node.start, node.end)
+        elif isinstance(node, ModifiedRuleExpression):
+            expr = self._rewrite_node(node.expr, rewrite, built)
+            if expr is not node.expr:
+                node = ModifiedRuleExpression(expr, node.modifier, node.start, node.end)
+        elif isinstance(node, LabelledRuleExpression):
+            expr = self._rewrite_node(node.expr, rewrite, built)
+            if expr is not node.expr:
+                node = LabelledRuleExpression(node.label, expr, node.start, node.end)
+        return rewrite(node, built)
+
+    def _flatten(self, root: Grammar):
+        def flatten(node, built):
+            if isinstance(node, Choice):
+                children = []
+                for child in node.children:
+                    # A cut in an alternative of the inner choice would skip the outer choice's later alternatives
+                    if isinstance(child, Choice) and not any(has_cut(inner) for inner in child.children):
+                        children.extend(child.children)
+                    else:
+                        children.append(child)
+                if len(children) == 1:
+                    return children[0]
+                if len(children) != len(node.children):
+                    return Choice(children, node.start, node.end)
+            elif isinstance(node, Combined) and not built:
+                # Sequences have no scope of their own, so cuts in them are unaffected
+                children = []
+                for child in node.children:
+                    children.extend(child.children if isinstance(child, Combined) else [child])
+                if len(children) == 1:
+                    return children[0]
+                if len(children) != len(node.children):
+                    return Combined(children, node.start, node.end)
+            return node
+
+        self._rewrite(root, flatten)
+
+    def _concatenate(self, root: Grammar):
+        def concatenate(node, built):
+            if built or not isinstance(node, Combined):
+                return node
+            children = []
+            for child in node.children:
+                if isinstance(child, Literal) and children and isinstance(children[-1], Literal):
+                    children[-1] = Literal(children[-1].value + child.value, children[-1].start, child.end)
+                else:
+                    children.append(child)
+            if len(children) == 1:
+                return children[0]
+            if len(children) != len(node.children):
+                return Combined(children, node.start, node.end)
+            return node
+
+        self._rewrite(root, concatenate)
+
+    def _shareable(self, node) -> bool:
+        """Whether the node could be matched by a rule of its own, with the same result."""
+        if isinstance(node, ModifiedRuleExpression):
+            # A repeated class is already matched by one call
+            return not isinstance(node.expr, CharacterClass) and not has_cut(node)
+        # A labelled expression must stay in its sequence, which names its result
+        return isinstance(node, (Combined, Choice)) and not has_cut(node)
+
+    def _occurrences(self, root: Grammar) -> Dict[tuple, List[tuple]]:
+        """Each expression which could be shared, by key, as the places it is written: (parent, index, node, built)."""
+        occurrences = {}
+        for rule in root.children:
+            built = self._built(rule)
+            stack = [(rule, None, rule.content)]
+            while stack:
+                parent, index, node = stack.pop()
+                if self._shareable(node) and _count(node) >= self.min_shared_size:
+                    occurrences.setdefault(_key(node), []).append((parent, index, node, built))
+                if isinstance(node, (Combined, Choice)):
+                    stack.extend((node, i, child) for i, child in enumerate(node.children))
+                elif isinstance(node, (ModifiedRuleExpression, LabelledRuleExpression)):
+                    stack.append((node, None, node.expr))
+        return occurrences
+
+    def _share(self, root: Grammar):
+        names: Set[str] = {_rule_name(rule) for rule in root.children}
+        while True:
+            repeated = [places for places in self._occurrences(root).values() if len(places) > 1]
+            if not repeated:
+                return
+            # The largest first, since the expressions within it are then only written once
+            places = max(repeated, key=lambda places: _count(places[0][2]))
+            target = next((_rule_name(parent) for parent, _, _, _ in places
+                           if isinstance(parent, Rule) and parent.transformer is None), None)
+            if target is None:
+                n = 0
+                while "shared{}".format(n) in names:
+                    n += 1
+                target = "shared{}".format(n)
+                names.add(target)
+                # Its result is only needed where one is built
+                transformer = None if any(built for _, _, _, built in places) else DISCARD
+                root.children.append(Rule(target, places[0][2], transformer))
+            for parent, index, node, _ in places:
+                if isinstance(parent, Rule):
+                    if _rule_name(parent) != target:
+                        parent.content = Identifier(target, node.start, node.end)
+                elif index is None:
+                    parent.expr = Identifier(target, node.start, node.end)
+                else:
+                    parent.children[index] = Identifier(target, node.start, node.end)
+
+    def _prune(self, root: Grammar):
+        rules = {_rule_name(rule): rule for rule in root.children}
+        if START not in rules:
+            return
+        reachable = {START}
+        stack = [rules[START]]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Identifier):
+                if node.name not in reachable and node.name in rules:
+                    reachable.add(node.name)
+                    stack.append(rules[node.name])
+            elif isinstance(node, (Combined, Choice)):
+                stack.extend(node.children)
+            # A label is not a reference to a rule
+            elif isinstance(node, (Rule, ModifiedRuleExpression, LabelledRuleExpression)):
+                stack.append(node.content if isinstance(node, Rule) else node.expr)
+        root.children = [rule for rule in root.children if _rule_name(rule) in reachable]
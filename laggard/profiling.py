@@ -0,0 +1,141 @@
+import functools
+import json
+import time
+from collections import Counter
+from typing import Callable, Dict, List
+
+from laggard.exceptions import ParseException
+from laggard.helpers import FAIL
+
+
+class RuleStats:
+    """What a :class:`Profile` records about one rule."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        #: The characters consumed by failed applications of the rule, before they failed.
+        self.backtrack_distance = 0
+        #: Time spent in the rule, including the rules it called; recursive calls are counted once.
+        self.cumulative_time = 0.0
+        #: Time spent in the rule, excluding the rules it called.
+        self.self_time = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "backtrack_distance": self.backtrack_distance,
+            "cumulative_time": self.cumulative_time,
+            "self_time": self.self_time,
+        }
+
+
+class Profile:
+    """
+    Collects per-rule statistics from a parser generated with `profile=True`, see :class:`~laggard.codegen.CodeGenerator`.
+
+    Examples:
+        To print each rule as it is tried, and a report at the end::
+
+            parser = MyParser(source)
+            parser.profile.listeners.append(lambda event, rule, index: print(event, rule, index))
+            parser.parse()
+            print(parser.profile.report())
+    """
+
+    def __init__(self):
+        self.rules: Dict[str, RuleStats] = {}
+        #: How many times each rule was applied at each index.
+        self.positions = Counter()
+        #: Called with ("enter", "match" or "fail", the rule name, the index) as the parse runs.
+        self.listeners: List[Callable[[str, str, int], None]] = []
+        # For each active call: the rule, its start time, and the time spent in the rules it called
+        self._frames = []
+        self._active = Counter()
+
+    def enter(self, rule: str, index: int):
+        try:
+            stats = self.rules[rule]
+        except KeyError:
+            stats = self.rules[rule] = RuleStats(rule)
+        stats.calls += 1
+        self.positions[(rule, index)] += 1
+        self._active[rule] += 1
+        for listener in self.listeners:
+            listener("enter", rule, index)
+        self._frames.append([stats, time.perf_counter(), 0.0])
+
+    def exit(self, rule: str, start: int, end: int, matched: bool):
+        stats, started, children = self._frames.pop()
+        elapsed = time.perf_counter() - started
+        stats.self_time += elapsed - children
+        self._active[rule] -= 1
+        if not self._active[rule]:
+            stats.cumulative_time += elapsed
+        if self._frames:
+            self._frames[-1][2] += elapsed
+        if matched:
+            stats.successes += 1
+        else:
+            stats.failures += 1
+            stats.backtrack_distance += end - start
+        for listener in self.listeners:
+            listener("match" if matched else "fail", rule, start)
+
+    def most_reparsed(self, count: int = 10):
+        """The (rule, index) pairs applied more than once, most often first, with how many times."""
+        return [(key, n) for key, n in self.positions.most_common(count) if n > 1]
+
+    def to_dict(self, reparsed: int = 10) -> dict:
+        return {
+            "rules": {name: stats.to_dict() for name, stats in self.rules.items()},
+            "most_reparsed": [{"rule": rule, "index": index, "count": n}
+                              for (rule, index), n in self.most_reparsed(reparsed)],
+        }
+
+    def to_json(self, reparsed: int = 10) -> str:
+        return json.dumps(self.to_dict(reparsed), indent=2)
+
+    def report(self, reparsed: int = 10) -> str:
+        """A table of the rules, by cumulative time, followed by the most re-parsed positions."""
+        lines = ["{:<24} {:>9} {:>9} {:>9} {:>11} {:>12} {:>12}".format(
+            "rule", "calls", "matched", "failed", "backtracked", "cumulative", "self")]
+        for stats in sorted(self.rules.values(), key=lambda s: s.cumulative_time, reverse=True):
+            lines.append("{:<24} {:>9} {:>9} {:>9} {:>11} {:>12.6f} {:>12.6f}".format(
+                stats.name, stats.calls, stats.successes, stats.failures, stats.backtrack_distance,
+                stats.cumulative_time, stats.self_time))
+        reparsed_positions = self.most_reparsed(reparsed)
+        if reparsed_positions:
+            lines.append("")
+            lines.append("Most re-parsed positions:")
+            for (rule, index), n in reparsed_positions:
+                lines.append("  {} at {}: {} times".format(rule, index, n))
+        return "\n".join(lines)
+
+
+def profiled(func):
+    """
+    Decorates a parser rule, so that its applications are recorded in the parser's `profile`.
+    The name of the rule is taken from the method, without its `parse_` prefix.
+    """
+    name = func.__name__[len("parse_"):] if func.__name__.startswith("parse_") else func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self):
+        profile = self.profile
+        buffer = self.buffer
+        start = buffer.offset + buffer.current_index
+        profile.enter(name, start)
+        try:
+            result = func(self)
+        except ParseException:
+            profile.exit(name, start, buffer.offset + buffer.current_index, False)
+            raise
+        profile.exit(name, start, buffer.offset + buffer.current_index, result is not FAIL)
+        return result
+
+    return wrapper
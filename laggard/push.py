@@ -0,0 +1,119 @@
+import asyncio
+import codecs
+from typing import Type
+
+from laggard.abstracts import Parser
+from laggard.buffer import PushBuffer
+from laggard.exceptions import ParseException, ExpectationException
+from laggard.helpers import FAIL
+
+# Returned by PushParser._next_item while the next item cannot be decided yet
+_MORE = object()
+
+
+class PushParser:
+    """
+    Parses input as it arrives, yielding each top-level item as soon as it is complete.
+
+    The items are matches of one rule of the grammar, parsed one after another; typically, the rule repeated by the
+    start rule. An item is complete once parsing it did not depend on where the input received so far ends.
+    Input before the current item is released as the parse moves on, so memory is bounded by the largest item.
+
+    Examples:
+        To parse statements from a socket as they arrive::
+
+            parser = PushParser(MyParser, "statement")
+            asyncio.ensure_future(parser.pump(reader))
+            async for statement in parser:
+                print(statement)
+    """
+
+    def __init__(self, parser: Type[Parser], item: str, chunk_size: int = 1 << 16):
+        """
+        Args:
+            parser: A generated parser class.
+            item: The name of the rule each item matches.
+            chunk_size: The least amount of input released at once, see :class:`~laggard.buffer.StreamBuffer`.
+        """
+        self.item = item
+        self.parser = parser("")
+        self.buffer = self.parser.buffer = PushBuffer(self.parser.buffer.skip, chunk_size)
+        self.parser.memo = self.parser._get_memo()
+        self._rule = getattr(self.parser, "parse_" + item)
+        # Created by the first asynchronous wait, in the running event loop
+        self._received: asyncio.Event = None
+
+    def feed(self, text: str):
+        """Adds text to the end of the input."""
+        self.buffer.feed(text)
+        if self._received is not None:
+            self._received.set()
+
+    def close(self):
+        """Marks the end of the input, after which the remaining items are parsed, or the parse fails."""
+        self.buffer.close()
+        if self._received is not None:
+            self._received.set()
+
+    async def pump(self, reader: asyncio.StreamReader, encoding: str = "utf-8", size: int = 1 << 16):
+        """Feeds the parser everything read from `reader`, decoded as it arrives, then closes it."""
+        decoder = codecs.getincrementaldecoder(encoding)()
+        while True:
+            data = await reader.read(size)
+            if not data:
+                self.feed(decoder.decode(b"", final=True))
+                self.close()
+                return
+            self.feed(decoder.decode(data))
+
+    def _next_item(self):
+        """The next item, or _MORE if it cannot be decided until more input arrives, or None at the end."""
+        buffer = self.buffer
+        if buffer.current_index >= len(buffer.source):
+            return None if buffer.exhausted else _MORE
+        buffer.mark()
+        buffer.reach = 0
+        # Each item is reported like a parse of its own
+        buffer.failure_index = -1
+        start = buffer.current_index
+        try:
+            result = self._rule()
+        except ParseException as e:
+            result = e
+        if buffer.reach > len(buffer.source) and not buffer.exhausted:
+            # The item depends on the input that has not arrived yet
+            buffer.abandon()
+            self.parser.memo.clear()
+            return _MORE
+        if result is FAIL or isinstance(result, ParseException) or buffer.current_index == start:
+            buffer.abandon()
+            if isinstance(result, ParseException) and not isinstance(result, ExpectationException):
+                raise result
+            raise self.parser.failure("Failed to parse: {} did not match".format(self.item))
+        # Releases the input the item was parsed from
+        buffer.commit()
+        self.parser.memo.clear()
+        return result
+
+    def __iter__(self):
+        """Iterates over the items which are complete in the input received so far."""
+        while True:
+            result = self._next_item()
+            if result is _MORE or result is None:
+                return
+            yield result
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            result = self._next_item()
+            if result is None:
+                raise StopAsyncIteration
+            if result is not _MORE:
+                return result
+            if self._received is None:
+                self._received = asyncio.Event()
+            self._received.clear()
+            await self._received.wait()
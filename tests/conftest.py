@@ -0,0 +1,9 @@
+from laggard.codegen import CodeGenerator
+from laggard.grammar_parser import Parser as GrammarParser
+
+
+def make_parser(grammar: str, **options):
+    """The parser class generated for a grammar, with the options of :class:`~laggard.codegen.CodeGenerator`."""
+    namespace = {}
+    exec(CodeGenerator(GrammarParser(grammar).parse(), **options).generate(), namespace)
+    return namespace["MyParser"]
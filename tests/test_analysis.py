@@ -0,0 +1,32 @@
+from laggard.analysis import GrammarAnalysis, ANY
+from laggard.grammar_parser import Parser as GrammarParser
+
+GRAMMAR = """
+start = statement*;
+statement = "if" block | "in" name | name "=" name | call;
+block = "{" statement* "}";
+name = "x" | "y" suffix?;
+suffix = "'"*;
+call = undefined "()";
+"""
+
+
+def analyse():
+    return GrammarAnalysis(GrammarParser(GRAMMAR).parse())
+
+
+def test_nullable_and_first():
+    analysis = analyse()
+    assert analysis.nullable == {"start": True, "statement": False, "block": False, "name": False,
+                                 "suffix": True, "call": False}
+    # An undefined rule may be empty, and begin with anything
+    assert analysis.first["statement"] == {"i", "x", "y", "(", ANY}
+    assert analysis.first["block"] == {"{"}
+    assert not analysis.is_predictable(GrammarParser("a = b? c;").parse().children[0].children[0])
+
+
+def test_conflicts():
+    conflicts = {conflict.rule: conflict for conflict in analyse().conflicts()}
+    assert set(conflicts) == {"statement"}
+    assert conflicts["statement"].alternatives == [0, 1, 2, 3]
+    assert ANY in conflicts["statement"].overlap and "i" in conflicts["statement"].overlap
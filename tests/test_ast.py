@@ -0,0 +1,80 @@
+import io
+import json
+import sys
+
+from laggard.grammar_asts import Combined, Rule, ModifiedRuleExpression, Literal, Identifier, CharacterClass
+from laggard.grammar_parser import Parser as GrammarParser
+
+SOURCE = 'start = a "b";\n  word = letter+;'
+
+
+def parse():
+    parser = GrammarParser(SOURCE)
+    return parser, parser.parse()
+
+
+def test_nodes_have_no_dict():
+    _, grammar = parse()
+    for node in (grammar, grammar.children[0], grammar.children[0].content):
+        assert not hasattr(node, "__dict__")
+
+
+def test_children_are_derived_from_fields():
+    node = ModifiedRuleExpression(Identifier("letter"), "+")
+    assert node.children == [node.expr, "+"]
+    assert Rule(Identifier("x"), Literal("y")).children[0].value == "y"
+
+
+def test_spans_and_positions():
+    parser, grammar = parse()
+    start, word = grammar.children
+    assert isinstance(start.content, Combined)
+    assert SOURCE[start.start:start.end] == 'start = a "b";'
+    assert SOURCE[start.content.start:start.content.end] == 'a "b"'
+    repetition = word.content
+    assert SOURCE[repetition.start:repetition.end] == "letter+"
+    assert word.get_position(parser.buffer) == (2, 3)
+    info = repetition.expr.get_parse_info(parser.buffer)
+    assert (info.line_no, info.col_no, info.length, info.section) == (2, 10, 6, "letter")
+
+
+def test_pretty_string():
+    rule = Rule(Identifier("x"), ModifiedRuleExpression(Combined([Literal("a"), Identifier("b")]), "+"))
+    assert rule.get_pretty_string() == "\n".join([
+        "Rule: Identifier", "  'x'", "  ModifiedRuleExpression", "    Combined", "      Literal", "        'a'",
+        "      Identifier", "        'b'", "    '+'"])
+    assert rule.get_pretty_string(depth=1) == "Rule: Identifier\n  'x'\n  ModifiedRuleExpression"
+
+
+def test_deep_trees_are_written_without_recursion():
+    node = Literal("x")
+    for _ in range(sys.getrecursionlimit() * 2):
+        node = ModifiedRuleExpression(node, "?")
+    out = io.StringIO()
+    node.write_pretty(out)
+    assert out.getvalue().count("\n") == sys.getrecursionlimit() * 4 + 1
+
+    out = io.StringIO()
+    node.write_json_lines(out, depth=2)
+    assert [json.loads(line)["level"] for line in out.getvalue().splitlines()] == [0, 1, 2]
+
+
+def test_json_lines():
+    _, grammar = parse()
+    out = io.StringIO()
+    grammar.write_json_lines(out)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert lines[1] == {"type": "Rule", "start": 0, "end": 14, "level": 1,
+                        "name": {"type": "Identifier", "start": 0, "end": 5, "name": "start"}, "transformer": None}
+    assert lines[-1] == {"type": "Identifier", "start": 24, "end": 30, "name": "letter", "level": 3}
+
+
+def test_json_lines_keep_character_classes():
+    grammar = GrammarParser("start = [^a-cx];").parse()
+    out = io.StringIO()
+    grammar.write_json_lines(out)
+    values = json.loads(out.getvalue().splitlines()[-1])
+    assert values == {"type": "CharacterClass", "start": 8, "end": 15, "level": 2, "ranges": [["a", "c"], ["x", "x"]],
+                      "negated": True}
+    node = CharacterClass([tuple(r) for r in values["ranges"]], values["negated"], values["start"], values["end"])
+    assert node.chars == grammar.children[0].content.chars and node.negated
@@ -0,0 +1,101 @@
+import io
+import re
+
+import pytest
+
+from laggard import main
+from laggard.abstracts import Parser
+from laggard.batch import parse_batch, parse_split, _split
+from laggard.exceptions import ParseException
+
+GRAMMAR = """
+start = greeting+;
+greeting = "hello" | "goodbye";
+"""
+
+SPLIT_GRAMMAR = """
+start = statement*;
+statement = greeting+ ";\\n";
+greeting = "hello" | "goodbye";
+"""
+
+TRANSFORMER_GRAMMAR = """
+start = greeting+;
+greeting:shout = "hello" | "goodbye";
+"""
+
+
+class ShoutingParser(main.compile_grammar(TRANSFORMER_GRAMMAR, use_cache=False)):
+    def shout(self, greeting):
+        return greeting.upper()
+
+
+@pytest.fixture
+def parser(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "_compiled", {})
+    return main.compile_grammar(GRAMMAR, cache_dir=str(tmp_path))
+
+
+def test_results_in_order(parser):
+    documents = ["hello", "goodbye", "nope", "hellohello"] * 5
+    results = list(parser.parse_batch(documents, workers=2, chunk_size=3, max_pending=2))
+    assert [result.index for result in results] == list(range(20))
+    assert results[3].result == ["hello", "hello"]
+    assert results[2].result is None and isinstance(results[2].error, ParseException)
+
+
+def test_results_as_completed_from_paths(parser, tmp_path):
+    paths = []
+    for i in range(6):
+        path = tmp_path / "{}.txt".format(i)
+        path.write_text("hello" * i or "oops")
+        paths.append(str(path))
+    paths.append(str(tmp_path / "missing.txt"))
+    results = sorted(parse_batch(parser, paths, paths=True, workers=2, chunk_size=2, ordered=False))
+    assert [len(result.result) for result in results[1:6]] == [1, 2, 3, 4, 5]
+    assert results[0].path == paths[0] and isinstance(results[0].error, ParseException)
+    assert isinstance(results[6].error, FileNotFoundError)
+
+
+def test_parser_must_be_compiled():
+    with pytest.raises(ValueError):
+        list(parse_batch(Parser, ["x"]))
+
+
+def test_subclasses_are_used_by_workers():
+    results = list(ShoutingParser.parse_batch(["hello", "goodbyehello"], workers=2, chunk_size=1))
+    assert [result.result for result in results] == [["HELLO"], ["GOODBYE", "HELLO"]]
+
+    class LocalParser(ShoutingParser):
+        pass
+
+    with pytest.raises(ValueError, match="top level"):
+        list(parse_batch(LocalParser, ["hello"]))
+
+
+def test_split_at_sync_points(parser, tmp_path):
+    source = "hello;\ngoodbye;\n" * 50 + "hellohello;\n"
+    split = main.compile_grammar(SPLIT_GRAMMAR, cache_dir=str(tmp_path))
+    assert parse_split(split, r";\n", source, workers=2, chunk_size=40) == split(source).parse()
+
+    path = tmp_path / "input.txt"
+    path.write_text(source)
+    assert len(parse_split(split, r";\n", path=str(path), workers=2, chunk_size=1)) == 101
+
+
+def test_split_errors_have_global_positions(tmp_path):
+    split = main.compile_grammar(SPLIT_GRAMMAR, cache_dir=str(tmp_path))
+    source = "hello;\n" * 30 + "goodbye;\nhi;\n" + "hello;\n" * 30
+    with pytest.raises(ParseException) as e:
+        parse_split(split, r";\n", source, workers=2, chunk_size=20)
+    assert "lineno=32, columnno=1" in str(e.value)
+
+
+def test_split_points():
+    parts = list(_split(io.StringIO("a;\nbb;\nccc;\nd"), re.compile(r";\n"), 2))
+    assert parts == [("a;\n", 0, (1, 1)), ("bb;\n", 3, (2, 1)), ("ccc;\n", 7, (3, 1)), ("d", 12, (4, 1))]
+    parts = list(_split(io.StringIO("a;b;c"), re.compile(";"), 1))
+    assert parts == [("a;", 0, (1, 1)), ("b;", 2, (1, 3)), ("c", 4, (1, 5))]
+    # A match which began in an earlier chunk, and one after several chunks without any
+    parts = list(_split(io.StringIO("aaaa;\n" + "b" * 20 + ";\nc"), re.compile(r";\n"), 5))
+    assert parts == [("aaaa;\n", 0, (1, 1)), ("b" * 20 + ";\n", 6, (2, 1)), ("c", 28, (3, 1))]
@@ -0,0 +1,140 @@
+import io
+import random
+
+import pytest
+
+from laggard import helpers
+from laggard.abstracts import Parser
+from laggard.buffer import Buffer, BytesBuffer, PushBuffer, StreamBuffer
+from laggard.exceptions import ParseException
+from laggard.infoholders import TextPosition
+
+SOURCE = "first\nsecond line\n\nfourth"
+
+
+def naive_position(source, index):
+    return TextPosition(source.count("\n", 0, index) + 1, index - source.rfind("\n", 0, index))
+
+
+def test_position_from_index():
+    buffer = Buffer(SOURCE)
+    for index in range(len(SOURCE) + 1):
+        assert buffer._get_position_from_index(index) == naive_position(SOURCE, index)
+
+
+def test_index_from_position_roundtrip():
+    buffer = Buffer(SOURCE)
+    for index in range(len(SOURCE) + 1):
+        assert buffer.get_index_from_position(buffer._get_position_from_index(index)) == index
+    with pytest.raises(IndexError):
+        buffer.get_index_from_position((5, 1))
+    with pytest.raises(IndexError):
+        buffer.get_index_from_position((1, 7))
+
+
+def test_line_index_follows_source():
+    buffer = Buffer("a\nb")
+    assert buffer._get_position_from_index(2) == (2, 1)
+    buffer.source = "ab\n\nc"
+    assert buffer._get_position_from_index(4) == (3, 1)
+
+
+def test_stream_buffer_releases_consumed_input(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("ab\n" * 100)
+    buffer = StreamBuffer.open(str(path), chunk_size=8)
+    for line in range(100):
+        with buffer:
+            assert helpers.expectManyOutOf(buffer, ["a", "b"]) == "ab"
+            assert buffer.current_pos == (line + 1, 3)
+            helpers.expect(buffer, "\n")
+        assert len(buffer.source) < 32
+    assert buffer.offset + buffer.current_index == 300
+    assert buffer.fetch_char() == "[EOF]"
+
+
+class FileParser(Parser):
+    def _get_buffer(self, source):
+        return StreamBuffer.open(source, chunk_size=4)
+
+    def parse_start(self):
+        return self.expect("ab")
+
+
+def test_stream_buffer_closed_after_failed_parse(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("ax" * 10)
+    parser = FileParser(str(path))
+    with pytest.raises(ParseException):
+        parser.parse()
+    assert parser.buffer.exhausted and parser.buffer.stream.map.closed
+
+
+def test_stream_buffer_keeps_marked_input():
+    buffer = StreamBuffer(io.StringIO("x" * 50 + "y"), chunk_size=4)
+    with pytest.raises(ParseException):
+        with buffer:
+            assert helpers.parseUntil(buffer, ["z"]) is None
+    assert buffer.current_index == 0 and buffer.offset == 0
+    assert len(helpers.parseUntil(buffer, ["y"])) == 50
+
+
+def naive_fetch(source, index, count, skip):
+    """Reads like the original list-based Buffer.fetch, returning the text and the index after it."""
+    text = ""
+    for i in range(count):
+        while index < len(source) and source[index] in skip:
+            index += 1
+        if index >= len(source):
+            text += "[EOF]"
+        else:
+            text += source[index]
+        index += 1
+    return text, min(index, len(source))
+
+
+def test_skip_table_matches_naive_skipping():
+    rng = random.Random(20)
+    skip = [" ", "\n"]
+    for _ in range(50):
+        source = "".join(rng.choice("ab \n") for _ in range(rng.randrange(30)))
+        buffer = Buffer(source, skip=skip)
+        assert buffer.skip == frozenset(skip)
+        for index in range(len(source) + 1):
+            for count in (1, 3):
+                buffer.current_index = index
+                expected, end = naive_fetch(source, index, count, skip)
+                assert buffer.peek(count) == expected
+                assert buffer.current_index == index
+                assert buffer.next_index() == next((i for i in range(index, len(source)) if source[i] not in skip),
+                                                   len(source))
+                assert buffer.fetch(count) == expected
+                assert buffer.current_index == end
+
+
+def test_tables_extend_as_input_is_fed():
+    rng = random.Random(21)
+    for _ in range(50):
+        buffer = PushBuffer([" ", "\n"])
+        table, starts = buffer.skip_table, buffer.line_starts
+        for _ in range(rng.randrange(1, 6)):
+            buffer.feed("".join(rng.choice("ab \n") for _ in range(rng.randrange(8))))
+            # Only extended, rather than built again
+            assert buffer.skip_table is table and buffer.line_starts is starts
+            rebuilt = Buffer(buffer.source, skip=buffer.skip)
+            assert table == rebuilt.skip_table and starts == rebuilt.line_starts
+        assert table.typecode == starts.typecode == "i"
+
+
+@pytest.mark.parametrize("source", [b"ab \r\n cd", bytearray(b"ab \r\n cd"), memoryview(b"ab \r\n cd")])
+def test_bytes_buffer(source):
+    buffer = BytesBuffer(source, skip=b" ")
+    assert buffer.skip == frozenset(b" ")
+    assert buffer.fetch(2) == b"ab"
+    assert buffer.lookahead() == ord("\r") and buffer.fetch(2) == b"\r\n"
+    start = buffer.current_index
+    assert buffer.fetch_char() == ord("c")
+    assert isinstance(buffer.span(start), memoryview) and bytes(buffer.span(start)) == b" c"
+    assert buffer.current_pos == TextPosition(2, 3)
+    assert buffer.fetch(3) == b"d"
+    assert buffer.fetch_char() == BytesBuffer.EOF
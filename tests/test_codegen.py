@@ -0,0 +1,262 @@
+import pytest
+
+from laggard.codegen import CodeGenerator
+from laggard.exceptions import ParseException, ExpectationException
+from laggard.grammar_parser import Parser as GrammarParser
+from laggard.helpers import FAIL
+
+from conftest import make_parser
+
+GRAMMAR = """
+start = item+;
+item = "let" name "=" value ";" | "print" value ";";
+name = "x" | "y";
+value = name | "1" ("+" "1")*;
+"""
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_failure_modes_agree(failure_mode):
+    parser = make_parser(GRAMMAR, failure_mode=failure_mode)
+    assert parser("letx=1+1;printx;").parse() == [
+        ["let", "x", "=", ["1", [["+", "1"]]], ";"],
+        ["print", "x", ";"],
+    ]
+    with pytest.raises(ParseException):
+        parser("letx=;").parse()
+
+
+def test_sentinel_mode_does_not_raise_while_backtracking():
+    parser = make_parser(GRAMMAR)("printy;")
+    assert parser.parse_item() == ["print", "y", ";"]
+    assert make_parser(GRAMMAR)("print;").parse_item() is FAIL
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_inlining_preserves_results(failure_mode):
+    source = "letx=1+1;printy;"
+    expected = make_parser(GRAMMAR, failure_mode=failure_mode, inline_threshold=0)(source).parse()
+    for threshold in (2, 5, 100):
+        assert make_parser(GRAMMAR, failure_mode=failure_mode, inline_threshold=threshold)(source).parse() == expected
+
+
+def test_inlining_reduces_call_depth():
+    generator = CodeGenerator(GrammarParser(GRAMMAR).parse())
+    code = generator.generate()
+    assert "fragment" not in code
+    assert generator.rule_call_depths["item"] == (3, 1)
+    assert "value: 5 -> 1" in generator.call_depth_report().splitlines()
+
+
+def test_predictive_choice_skips_ruled_out_alternatives():
+    code = CodeGenerator(GrammarParser(GRAMMAR).parse()).generate()
+    assert "self.buffer.next_index()" in code
+    parser = make_parser(GRAMMAR)("printx;")
+    calls = []
+    original = parser.match
+    parser.match = lambda literal: calls.append(literal) or original(literal)
+    parser.parse_item()
+    assert "let" not in calls
+    assert make_parser(GRAMMAR, predictive=False)("letx=1;").parse() == make_parser(GRAMMAR)("letx=1;").parse()
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_cut_commits_to_alternative(failure_mode):
+    cut = make_parser('start = "if" ~ "(" "x" ")" | "i" "f" "x";', failure_mode=failure_mode)
+    uncut = make_parser('start = "if" "(" "x" ")" | "i" "f" "x";', failure_mode=failure_mode)
+    assert cut("if(x)").parse() == ["if", "(", "x", ")"]
+    assert uncut("ifx").parse() == ["i", "f", "x"]
+    with pytest.raises(ParseException):
+        cut("ifx").parse()
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_cut_in_repetition_fails_whole_repetition(failure_mode):
+    parser = make_parser('start = ("a" ~ "b")* "a" "c";', failure_mode=failure_mode)
+    assert make_parser('start = ("a" "b")* "a" "c";')("abac").parse() == [[["a", "b"]], "a", "c"]
+    with pytest.raises(ParseException):
+        parser("abac").parse()
+
+
+def test_cut_releases_memo_entries():
+    grammar = 'start = (item ~)*; item = "x" "y" | "x" "z";'
+    parser = make_parser(grammar, packrat=True)("xyxz" * 50)
+    assert len(parser.parse()) == 100
+    assert len(parser.memo) <= 2
+
+
+TRANSFORMED = """
+start = (statement | comment)+;
+statement:assign = target:name "=" value:number ";";
+comment:discard = "#" ("a" | "b" | " ")* ";";
+name:text = letter+;
+letter = "a" | "b";
+number:integer = ("1" | "2")+;
+"""
+
+
+@pytest.mark.parametrize("inline_threshold", [32, 0])
+@pytest.mark.parametrize("packrat", [False, True])
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_transformers(failure_mode, packrat, inline_threshold):
+    class Transformed(make_parser(TRANSFORMED, failure_mode=failure_mode, packrat=packrat,
+                                  inline_threshold=inline_threshold, text_transformers=["integer"])):
+        def assign(self, result):
+            return result["target"], result["value"]
+
+        def integer(self, text):
+            return int(text)
+
+    assert Transformed("ab=12;# ab;ba=2;").parse() == [("ab", 12), None, ("ba", 2)]
+    with pytest.raises(ParseException):
+        Transformed("ab=12;#c;").parse()
+
+
+def test_text_rules_build_no_lists():
+    code = CodeGenerator(GrammarParser(TRANSFORMED).parse(), inline_threshold=0).generate()
+    text_rules = code.split("def parse_name")[1].split("def parse_letter")[0]
+    assert "append" not in text_rules and "[" not in text_rules.replace("self.buffer.source[", "")
+    assert "OptionallyNamedTuple(['target', None, 'value', None]" in code
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_text_rules_return_spans(failure_mode):
+    parser = make_parser('start = word+; word:text = "a" "b"*;', failure_mode=failure_mode, spans=True)
+    words = parser("abbaab").parse()
+    assert words == ["abb", "a", "ab"]
+    assert [(word.start, word.end) for word in words] == [(0, 3), (3, 4), (4, 6)]
+
+
+CLASSES = r"""
+start = (word | number | quoted)+;
+word = [a-zA-Z_] [a-zA-Z0-9_]*;
+number:text = [0-9]+ ("." [0-9]+)?;
+quoted = "'" [^'\\]+ "'";
+"""
+
+
+def test_character_classes_parse():
+    rules = GrammarParser(r'a = [0-9a-f\]\n-] [^x-z];').parse().children
+    first, second = rules[0].content.children
+    assert first.ranges == [("0", "9"), ("a", "f"), ("]", "]"), ("\n", "\n"), ("-", "-")]
+    assert first.chars == frozenset("0123456789abcdef]\n-") and not first.negated
+    assert second.negated and second.chars == frozenset("xyz")
+    for grammar in ("a = [];", "a = [z-a];", "a = [ab"):
+        with pytest.raises(ParseException):
+            GrammarParser(grammar).parse()
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_literal_escapes(failure_mode):
+    rules = GrammarParser(r'a = "\n\t\x41" "\\\q";').parse().children
+    assert [literal.value for literal in rules[0].content.children] == ["\n\tA", "\\q"]
+    parser = make_parser(r'start = "a\n" "b";', failure_mode=failure_mode)
+    assert parser("a\nb").parse() == ["a\n", "b"]
+    with pytest.raises(ParseException):
+        parser(r"a\nb").parse()
+    with pytest.raises(ParseException):
+        GrammarParser(r'a = "\x4";').parse()
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_character_classes(failure_mode):
+    parser = make_parser(CLASSES, failure_mode=failure_mode)
+    code = CodeGenerator(GrammarParser(CLASSES).parse(), failure_mode=failure_mode).generate()
+    assert "frozenset('0123456789')" in code and "_run(" in code
+    assert parser("x1' 2.5'3.25").parse() == [["x", ["1"]], ["'", [" ", "2", ".", "5"], "'"], "3.25"]
+    with pytest.raises(ParseException, match=r"expected \[\^'\\\]" if failure_mode == "exception" else None):
+        parser("''x").parse()
+
+
+def test_character_classes_match_choices():
+    choices = CLASSES.replace("[0-9]", "({})".format(" | ".join('"{}"'.format(d) for d in "0123456789")))
+    source = "abc'1.5'22.0x9'a b'3.75"
+    assert make_parser(CLASSES)(source).parse() == make_parser(choices)(source).parse()
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_errors_report_farthest_failure(failure_mode):
+    parser = make_parser(GRAMMAR, failure_mode=failure_mode)
+    with pytest.raises(ExpectationException) as error:
+        parser("letx=1;letx=;").parse()
+    assert error.value.index == 12
+    assert error.value.terminals == {"1", "x", "y"}
+    assert str(error.value) == "Failed to parse: expected one of '1', 'x', 'y', got ';' at Position(lineno=1, columnno=13)"
+    with pytest.raises(ParseException, match="expected one of 'let', 'print', got 'pr' at"):
+        parser("pr").parse()
+
+
+NULLABLE = """
+start = item+;
+item = "let" name ("=" value)? ";" | "print" value? ";" | "if" [xy] "{" item* "}";
+name = "x" | "y" | [a-c]+;
+value = name | "1" ("+" "1")* | "(" value ")";
+"""
+
+
+def test_errors_agree_across_failure_modes_and_prediction():
+    # The choices which match through a nullable alternative still record what the lookahead ruled out
+    parsers = [make_parser(NULLABLE, failure_mode=failure_mode, predictive=predictive)
+               for failure_mode in ("sentinel", "exception") for predictive in (True, False)]
+    for source in ("print=", "printz)", "letx=(a;", "ifx{letb;printletlet", "print1+1+", "ifz"):
+        messages = set()
+        for parser in parsers:
+            with pytest.raises(ParseException) as error:
+                parser(source).parse()
+            messages.add(str(error.value))
+        assert len(messages) == 1, source
+
+
+BINARY = r"""
+start = message+;
+message = (command | number) "\r\n" body;
+command:text = [A-Z]+;
+number:text = [0-9]+;
+body:text = "\x00" [^\x00]* "\x00";
+"""
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_binary_input(failure_mode):
+    parser = make_parser(BINARY, failure_mode=failure_mode, binary=True)
+    for source in (b"GET\r\n\x00a\xff\x0012\r\n\x00\x00", bytearray(b"GET\r\n\x00a\xff\x00"),
+                   memoryview(b"GET\r\n\x00a\xff\x00")):
+        result = parser(source).parse()
+        assert [bytes(part) for part in result[0]] == [b"GET", b"\r\n", b"\x00a\xff\x00"]
+    with pytest.raises(ExpectationException) as error:
+        parser(b"GET\n").parse()
+    assert str(error.value) == r"Failed to parse: expected b'\r\n', got b'\n' at Position(lineno=1, columnno=4)"
+    with pytest.raises(ParseException, match=r"expected one of \[0-9\], \[A-Z\], got b'\\x01'"):
+        parser(b"\x01").parse()
+    for grammar in ('start = "\u00e9\u20ac";', 'start = [a-\u20ac];'):
+        with pytest.raises(ValueError, match="above"):
+            make_parser(grammar, binary=True)
+
+
+KEYWORDS = """
+start = (keyword ";")+;
+keyword = "in" | "int" | "if" | "is" | "else" | "elif" | "while";
+"""
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_choices_of_literals_use_tables(failure_mode):
+    code = CodeGenerator(GrammarParser(KEYWORDS).parse(), failure_mode=failure_mode).generate()
+    assert "LiteralTable(('in', 'int', 'if', 'is', 'else', 'elif', 'while',))" in code
+    parser = make_parser(KEYWORDS, failure_mode=failure_mode)
+    assert parser("if;else;elif;while;").parse() == [["if", ";"], ["else", ";"], ["elif", ";"], ["while", ";"]]
+    # As in any choice, "int" is never reached
+    with pytest.raises(ParseException, match="expected ';', got 't'"):
+        parser("int;").parse()
+    with pytest.raises(ParseException, match="expected one of 'elif', 'else', 'if', 'in', 'int', 'is', 'while',"):
+        parser("if;for;").parse()
+    binary = make_parser(KEYWORDS, failure_mode=failure_mode, binary=True)
+    assert binary(b"is;elif;").parse() == [[b"is", b";"], [b"elif", b";"]]
+
+
+def test_parser_context_manager():
+    parser = make_parser(GRAMMAR)("x")
+    with pytest.raises(ParseException):
+        with parser("name"):
+            parser.expect("y")
+    assert parser.stack == [] and parser.buffer.stack == []
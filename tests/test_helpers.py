@@ -0,0 +1,130 @@
+import io
+import pickle
+
+import pytest
+
+from laggard import helpers
+from laggard.buffer import Buffer, BytesBuffer, StreamBuffer
+from laggard.exceptions import ParseException, ExpectationException
+
+
+def test_expect_many_out_of_skips_only_initially():
+    buffer = Buffer("  ab1 c", skip=[" "])
+    assert helpers.expectManyOutOf(buffer, list("abc1")) == "ab1"
+    assert buffer.current_index == 5
+    assert helpers.expectManyOutOf(buffer, list("abc")) == "c"
+
+
+def test_expect_one_of_failure_keeps_position():
+    buffer = Buffer(" x", skip=[" "])
+    with pytest.raises(ParseException, match="got x"):
+        helpers.expectOneOf(buffer, ["a", "b"])
+    assert buffer.current_index == 0 and buffer.stack == []
+    assert helpers.expectOneOf(buffer, [" "], skip=False) == " "
+    assert helpers.expectOneOf(buffer, ["x"]) == "x"
+
+
+def test_parse_until_consumes_terminator():
+    buffer = Buffer('abc"def\'')
+    assert helpers.parseUntil(buffer, ['"', "'"]) == "abc"
+    assert helpers.parseUntil(buffer, ['"', "'"]) == "def"
+    with pytest.raises(ParseException):
+        helpers.parseUntil(buffer, ['"'])
+
+
+def test_match_compares_in_place():
+    buffer = Buffer("  let x", skip=[" "])
+    assert helpers.match(buffer, "lex") is helpers.FAIL
+    assert buffer.current_index == 0
+    assert helpers.match(buffer, "let x") == "let x"
+    assert helpers.match(buffer, "[EOF]") is helpers.FAIL
+    with pytest.raises(ParseException, match="expected 'y', got '\\[EOF\\]'"):
+        helpers.expect(buffer, "y")
+    assert buffer.stack == []
+
+
+def test_spans():
+    buffer = Buffer('  ab "quoted text"', skip=[" "])
+    name = helpers.expectManyOutOf(buffer, list("ab"), span=True)
+    helpers.expect(buffer, '"')
+    quoted = helpers.parseUntil(buffer, ['"'], span=True)
+    assert (name.start, name.end, str(name)) == (2, 4, "ab")
+    assert quoted == "quoted text" and len(quoted) == 11
+    assert buffer.current_index == len(buffer.source)
+
+
+def test_character_class_runs():
+    digits = frozenset("0123456789")
+    buffer = Buffer(" 1 23x", skip=[" "])
+    assert helpers.match_run(buffer, digits, required=True) == ["1", "2", "3"]
+    assert buffer.current_index == 5
+    assert helpers.match_run(buffer, digits, required=True) is helpers.FAIL
+    assert helpers.match_run(buffer, digits) == [] and buffer.current_index == 5
+    assert helpers.match_class(buffer, digits, negated=True) == "x"
+    assert helpers.match_class(buffer, digits) is helpers.FAIL
+    with pytest.raises(ParseException, match=r"expected \[0-9\], got \[EOF\]"):
+        helpers.expect_run(buffer, digits, required=True)
+
+
+def test_character_class_runs_read_more_input():
+    stream = StreamBuffer(io.StringIO("12 " + " " * 5 + "345 x"), skip=[" "], chunk_size=4)
+    assert helpers.match_run(stream, frozenset("0123456789")) == list("12345")
+    assert helpers.match_class(stream, frozenset("x")) == "x"
+
+
+def test_failures_are_described_lazily():
+    buffer = Buffer("ab\ncd", skip=["\n"])
+    helpers.match(buffer, "ax")
+    helpers.match(buffer, "a")
+    buffer.current_index = 2
+    assert helpers.match(buffer, "x") is helpers.FAIL
+    assert helpers.match_class(buffer, frozenset("0123456789")) is helpers.FAIL
+    assert buffer.failure_index == 3 and buffer.expected == {"x", (frozenset("0123456789"), False)}
+    with pytest.raises(ExpectationException) as error:
+        helpers.expect(buffer, "cx")
+    assert error.value._message is None
+    assert str(error.value) == "Failed to parse: expected 'cx', got 'cd' at Position(lineno=2, columnno=1)"
+    copy = pickle.loads(pickle.dumps(error.value))
+    assert copy.buffer is None and str(copy) == str(error.value)
+
+
+def test_byte_helpers():
+    buffer = BytesBuffer(bytearray(b"GET  /a\x00"), skip=b" ")
+    assert helpers.match_bytes(buffer, b"GET") == b"GET"
+    assert helpers.match_bytes(buffer, b"/b") is helpers.FAIL
+    assert helpers.match_class(buffer, frozenset(b"/")) == ord("/")
+    run = helpers.match_byte_run(buffer, frozenset(b"\x00"), negated=True, required=True)
+    assert bytes(run) == b"a"
+    assert helpers.match_byte_run(buffer, frozenset(b"ab"), required=True) is helpers.FAIL
+    assert buffer.failure_index == 7 and buffer.expected == {(frozenset(b"ab"), False)}
+    with pytest.raises(ExpectationException) as error:
+        helpers.expect_bytes(buffer, b"\r\n")
+    assert str(error.value) == "Failed to parse: expected b'\\r\\n', got b'\\x00' at Position(lineno=1, columnno=8)"
+    assert helpers.expect_byte_run(buffer, frozenset(range(32)), build=False) is None
+    assert buffer.current_index == 8
+    with pytest.raises(ExpectationException, match=r"^Failed to parse: expected b'\\r\\n', got \[EOF\] at"):
+        helpers.expect_bytes(buffer, b"\r\n")
+    # Without skipped bytes, the run is a slice of the input
+    buffer = BytesBuffer(b"abc")
+    run = helpers.match_byte_run(buffer, frozenset(b"ab"))
+    assert run.obj is buffer.source.obj and bytes(run) == b"ab"
+
+
+def test_literal_tables_match_in_order():
+    table = helpers.LiteralTable(("in", "int", "if", "is", "else"))
+    assert table["i"] == ("in", "int", "if", "is") and table.literals[-1] == "else"
+    buffer = Buffer("intif x")
+    # As in a choice, the first literal which matches wins, even if a later one is longer
+    assert helpers.match_literals(buffer, table) == "in"
+    assert buffer.current_index == 2
+    buffer.current_index = 0
+    assert helpers.match_literals(buffer, helpers.LiteralTable(("int", "in"))) == "int"
+    assert helpers.match_literals(buffer, table) == "if"
+    assert helpers.match_literals(buffer, table) is helpers.FAIL and buffer.current_index == 5
+    with pytest.raises(ExpectationException) as error:
+        helpers.expect_literals(buffer, table)
+    assert error.value.terminals == set(table.literals)
+    assert str(error.value).startswith("Failed to parse: expected one of 'else', 'if', 'in', 'int', 'is', got ' x'")
+    stream = StreamBuffer(io.StringIO("x" * 3 + "else"), chunk_size=2)
+    stream.current_index = 3
+    assert helpers.match_literals(stream, table) == "else"
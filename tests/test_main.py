@@ -0,0 +1,44 @@
+import os
+
+from laggard import main
+from laggard.abstracts import Parser
+
+GRAMMAR = """
+start = greeting+;
+greeting = "hello" | "goodbye";
+"""
+
+
+def test_compile_grammar_caches_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "_compiled", {})
+    parser = main.compile_grammar(GRAMMAR, cache_dir=str(tmp_path))
+    assert issubclass(parser, Parser)
+    assert parser("hellogoodbye").parse() == ["hello", "goodbye"]
+    assert main.compile_grammar(GRAMMAR, cache_dir=str(tmp_path)) is parser
+    assert any(name.endswith(".py") for name in os.listdir(str(tmp_path)))
+    assert os.listdir(str(tmp_path / "__pycache__"))
+
+    # A fresh process finds the module on disk, and never looks at the grammar
+    monkeypatch.setattr(main, "_compiled", {})
+    monkeypatch.setattr(main, "_generate_source", None)
+    reloaded = main.compile_grammar(GRAMMAR, cache_dir=str(tmp_path))
+    assert reloaded is not parser
+    assert reloaded("goodbye").parse() == ["goodbye"]
+
+
+def test_options_are_part_of_the_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "_compiled", {})
+    plain = main.compile_grammar(GRAMMAR, cache_dir=str(tmp_path))
+    packrat = main.compile_grammar(GRAMMAR, cache_dir=str(tmp_path), packrat=True)
+    assert plain is not packrat
+    assert len([name for name in os.listdir(str(tmp_path)) if name.endswith(".py")]) == 2
+
+
+def test_generator_changes_are_part_of_the_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "_compiled", {})
+    main.compile_grammar(GRAMMAR, cache_dir=str(tmp_path))
+    # As if the code generator had changed since the module was cached
+    monkeypatch.setattr(main, "_compiled", {})
+    monkeypatch.setattr(main, "_generator_hash", lambda: "changed")
+    main.compile_grammar(GRAMMAR, cache_dir=str(tmp_path))
+    assert len([name for name in os.listdir(str(tmp_path)) if name.endswith(".py")]) == 2
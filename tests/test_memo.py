@@ -0,0 +1,150 @@
+import random
+
+import pytest
+
+from laggard.buffer import Buffer
+from laggard.exceptions import ParseException
+from laggard.memo import MemoTable, LRUMemoTable, CommittedMemoTable, MemoEntry, create_memo
+
+from conftest import make_parser
+
+GRAMMAR = """
+start = e;
+e = t "+" e | t "-" e | t;
+t = "(" e ")" | "1";
+"""
+
+
+STATEMENTS = """
+start = statement*;
+statement = e ";";
+e = t "+" e | t "-" e | t;
+t = "(" e ")" | "1";
+"""
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+@pytest.mark.parametrize("policy", ["unbounded", "lru", "committed"])
+def test_packrat_matches_plain(policy, failure_mode):
+    source = "(" * 6 + "1+1" + ")" * 6 + "-1"
+    expected = make_parser(GRAMMAR, failure_mode=failure_mode)(source).parse()
+    parser = make_parser(GRAMMAR, packrat=True, memo_policy=policy, memo_size=16, failure_mode=failure_mode)(source)
+    assert parser.parse() == expected
+    assert len(parser.memo) > 0
+
+
+def test_lru_evicts_oldest():
+    memo = LRUMemoTable(2)
+    memo.put("a", 0, MemoEntry("a", 1))
+    memo.put("b", 0, MemoEntry("b", 1))
+    memo.get("a", 0)
+    memo.put("c", 0, MemoEntry("c", 1))
+    assert memo.get("b", 0) is None
+    assert memo.get("a", 0) is not None and len(memo) == 2
+
+
+def test_committed_prunes_behind_marks():
+    buffer = Buffer("abcdef")
+    memo = CommittedMemoTable(buffer, interval=100)
+    for i in range(4):
+        memo.put("r", i, MemoEntry("x", i + 1))
+    buffer.current_index = 3
+    buffer.stack.append(2)
+    memo.prune(memo.committed_index)
+    assert memo.get("r", 1) is None
+    assert memo.get("r", 2) is not None and len(memo) == 2
+
+
+def test_unknown_policy():
+    assert type(create_memo("unbounded", Buffer(""))) is MemoTable
+    with pytest.raises(ValueError):
+        create_memo("forever", Buffer(""))
+
+
+def parse_or_error(parser):
+    try:
+        return parser.parse()
+    except ParseException as e:
+        # Errors must be reported the same way, whichever entries were reused
+        return str(e)
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+@pytest.mark.parametrize("policy", ["unbounded", "committed"])
+def test_edits_match_a_fresh_parse(policy, failure_mode):
+    parser_class = make_parser(STATEMENTS, packrat=True, memo_policy=policy, failure_mode=failure_mode)
+    rng = random.Random(4)
+    parser = parser_class("1+(1-1);(1);" * 5)
+    parse_or_error(parser)
+    for _ in range(60):
+        offset = rng.randrange(len(parser.source) + 1)
+        deleted = rng.randrange(min(3, len(parser.source) - offset) + 1)
+        inserted = "".join(rng.choice("()+-1;") for _ in range(rng.randrange(3)))
+        parser = parser.edit(offset, deleted, inserted)
+        assert parse_or_error(parser) == parse_or_error(parser_class(parser.source)), parser.source
+
+
+def test_edits_reuse_unaffected_entries():
+    parser_class = make_parser(STATEMENTS, packrat=True)
+    parser = parser_class("1+(1-1);" * 200)
+    parser.parse()
+    edited = parser.edit(805, 1, "(1+1)")
+    assert edited.source[800:812] == "1+(1-(1+1));"
+    assert edited.parse() == parser_class(edited.source).parse()
+    # Only the edited statement, and the repetition around it, are parsed again
+    assert len(edited.memo) < 20 < len(parser.memo)
+
+
+def test_reparse_cost_grows_with_the_log_of_the_items():
+    parser_class = make_parser(STATEMENTS, packrat=True)
+
+    def lookups(statements):
+        parser = parser_class("1+(1-1);" * statements)
+        parser.parse()
+        edited = parser.edit(8 * (statements // 2) + 5, 1, "(1+1)")
+        indices = []
+        get = edited.memo.get
+        edited.memo.get = lambda rule, index: indices.append(index) or get(rule, index)
+        assert edited.parse()[statements // 2] == parser_class("1+(1-(1+1));").parse()[0]
+        return len(indices)
+
+    # Unaffected runs of statements are reused whole, so 16 times as many cost a few more lookups, not 16 times as many
+    small, large = lookups(500), lookups(8000)
+    assert large < small + 40 < 100
+
+
+def test_edits_at_the_end_invalidate_lookahead():
+    parser_class = make_parser(STATEMENTS, packrat=True)
+    parser = parser_class("1;1+1")
+    with pytest.raises(ParseException):
+        parser.parse()
+    parser = parser.edit(5, 0, ";")
+    assert parser.parse() == parser_class("1;1+1;").parse()
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_edits_move_reused_spans(failure_mode):
+    parser = make_parser('start = item+; item:text = [a-z]+ ";";', packrat=True, spans=True,
+                         failure_mode=failure_mode)("aa;bb;cc;")
+    parser.parse()
+    parser = parser.edit(0, 0, "xyz;")
+    spans = parser.parse()
+    assert [str(span) for span in spans] == ["xyz;", "aa;", "bb;", "cc;"]
+    for span in spans:
+        assert parser.source[span.start:span.end] == str(span)
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_edits_report_the_same_errors(failure_mode):
+    parser_class = make_parser('start = item+ "!"; item = "a"+ "b" | "a"+ "c";', packrat=True,
+                               failure_mode=failure_mode)
+    parser = parser_class("abababaax!")
+    with pytest.raises(ParseException):
+        parser.parse()
+    edited = parser.edit(0, 0, "ab")
+    with pytest.raises(ParseException) as error:
+        edited.parse()
+    with pytest.raises(ParseException) as fresh:
+        parser_class(edited.source).parse()
+    assert str(error.value) == str(fresh.value)
+    assert "expected one of 'a', 'b', 'c', got 'x' at Position(lineno=1, columnno=11)" in str(error.value)
@@ -0,0 +1,71 @@
+import pytest
+
+from laggard.grammar_parser import Parser as GrammarParser
+from laggard.optimizer import GrammarOptimizer, PASSES
+
+from conftest import make_parser
+
+GRAMMAR = """
+start = statement+;
+statement = "let" name "=" value ";" | "print" "(" value ")" ";" | ("if" | ("while" | "until")) value block;
+block = "{" statement* "}";
+keyword:text = ("k" "e" ("y" "w")) "ord";
+name = ("x" | "y") ("1" "2" | "3" "4");
+value = name | (("x" | "y") ("1" "2" | "3" "4")) "!" | number;
+number:text = ("0" | "1") ("e" "-" ("0" | "1"))?;
+unused = keyword;
+"""
+
+SOURCE = "letx12=y12;print(1e-0);ifx34{whiley12{untilx12{}}print(0);}"
+
+
+def rules(grammar):
+    return {rule.name if isinstance(rule.name, str) else rule.name.name: rule for rule in grammar.children}
+
+
+def test_passes_report_removed_nodes():
+    grammar = GrammarParser(GRAMMAR).parse()
+    before = grammar.get_pretty_string()
+    optimizer = GrammarOptimizer()
+    optimized = optimizer.optimize(grammar)
+    assert grammar.get_pretty_string() == before
+    assert list(optimizer.removed) == list(PASSES)
+    assert all(count > 0 for count in optimizer.removed.values())
+    assert optimizer.report().splitlines()[0] == "flatten: {} nodes removed".format(optimizer.removed["flatten"])
+
+    optimized = rules(optimized)
+    assert set(optimized) == {"start", "statement", "block", "name", "value", "number"}
+    # Nested choices are spliced, and the choice of "value" now calls "name" for its copy of it
+    assert [type(child).__name__ for child in optimized["statement"].content.children[2].children[0].children] == \
+        ["Literal"] * 3
+    assert optimized["value"].content.children[1].children[0].name == "name"
+    # Only rules whose result is not built join their literals
+    number = optimized["number"].content
+    assert number.children[1].expr.children[0].value == "e-"
+    assert optimized["statement"].content.children[1].children[1].value == "("
+
+
+def test_passes_are_switchable():
+    optimizer = GrammarOptimizer(["prune"])
+    optimized = optimizer.optimize(GrammarParser(GRAMMAR).parse())
+    assert optimizer.removed == {"prune": 11}
+    assert "unused" not in rules(optimized) and "keyword" not in rules(optimized)
+    assert GrammarOptimizer([]).optimize(GrammarParser(GRAMMAR).parse()).get_pretty_string() == \
+        GrammarParser(GRAMMAR).parse().get_pretty_string()
+    with pytest.raises(ValueError):
+        GrammarOptimizer(["inline"])
+
+
+def test_choices_with_cuts_are_not_flattened():
+    grammar = GrammarParser('start = ("a" ~ "b" | "a") | "ac";').parse()
+    optimizer = GrammarOptimizer(["flatten"])
+    assert optimizer.optimize(grammar).get_pretty_string() == grammar.get_pretty_string()
+    assert optimizer.removed == {"flatten": 0}
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+@pytest.mark.parametrize("packrat", [False, True])
+def test_optimized_parsers_give_the_same_results(failure_mode, packrat):
+    plain = make_parser(GRAMMAR, failure_mode=failure_mode, packrat=packrat)
+    optimized = make_parser(GRAMMAR, failure_mode=failure_mode, packrat=packrat, optimize=PASSES)
+    assert optimized(SOURCE).parse() == plain(SOURCE).parse()
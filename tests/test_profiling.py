@@ -0,0 +1,37 @@
+import json
+
+from laggard.codegen import CodeGenerator
+from laggard.grammar_parser import Parser as GrammarParser
+
+from conftest import make_parser
+
+GRAMMAR = """
+start = item+;
+item = pair | word;
+pair = word "=" word;
+word = "a" | "b";
+"""
+
+
+def test_disabled_profiling_generates_plain_code():
+    assert "profiled" not in CodeGenerator(GrammarParser(GRAMMAR).parse()).generate()
+    assert make_parser(GRAMMAR)("a").profile is None
+
+
+def test_profile_counts_and_reports():
+    parser_class = make_parser(GRAMMAR, profile=True)
+    parser = parser_class("a=bb")
+    events = []
+    parser.profile.listeners.append(lambda event, rule, index: events.append((event, rule, index)))
+    assert parser.parse() == [["a", "=", "b"], "b"]
+
+    pair = parser.profile.rules["pair"]
+    assert (pair.calls, pair.successes, pair.failures) == (2, 1, 1)
+    # The second pair matched "b" before failing
+    assert pair.backtrack_distance == 1
+    assert parser.profile.rules["start"].cumulative_time >= parser.profile.rules["item"].cumulative_time
+    assert (("word", 3), 2) in parser.profile.most_reparsed()
+    assert events[0] == ("enter", "start", 0) and events[-1] == ("match", "start", 0)
+
+    assert "pair" in parser.profile.report()
+    assert json.loads(parser.profile.to_json())["rules"]["word"]["calls"] == 4
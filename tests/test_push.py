@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from laggard.exceptions import ParseException
+from laggard.push import PushParser
+
+from conftest import make_parser
+
+GRAMMAR = """
+start = statement*;
+statement = word "=" word ";";
+word = letter+;
+letter = "a" | "b";
+"""
+
+
+@pytest.mark.parametrize("failure_mode", ["sentinel", "exception"])
+def test_items_are_yielded_once_complete(failure_mode):
+    parser = PushParser(make_parser(GRAMMAR, failure_mode=failure_mode), "statement", chunk_size=4)
+    parser.feed("ab=b")
+    # The word may continue
+    assert list(parser) == []
+    parser.feed("a;b=")
+    assert list(parser) == [[["a", "b"], "=", ["b", "a"], ";"]]
+    parser.feed("b;" + "a=b;" * 10)
+    assert len(list(parser)) == 11
+    # The consumed input has been released
+    assert len(parser.buffer.source) < 8
+    parser.close()
+    assert list(parser) == []
+
+
+def test_async_iteration():
+    async def run():
+        parser = PushParser(make_parser(GRAMMAR, packrat=True), "statement")
+        results = []
+
+        async def consume():
+            async for item in parser:
+                results.append(item)
+
+        task = asyncio.ensure_future(consume())
+        for chunk in ["a=", "b;b", "=a"]:
+            parser.feed(chunk)
+            await asyncio.sleep(0)
+        # The first statement arrives before the end of the input
+        assert len(results) == 1
+        parser.feed(";")
+        parser.close()
+        await task
+        return results
+
+    assert len(asyncio.run(run())) == 2
+
+
+def test_errors_are_raised():
+    parser = PushParser(make_parser(GRAMMAR), "statement")
+    parser.feed("a=b;a=;")
+    with pytest.raises(ParseException):
+        list(parser)
+
+    parser = PushParser(make_parser(GRAMMAR), "statement")
+    parser.feed("a=b;a")
+    parser.close()
+    with pytest.raises(ParseException):
+        list(parser)